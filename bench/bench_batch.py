@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Mesure du débit des lots avec un FFmpeg simulé (bench/fake_ffmpeg.py)
+
+Mesures: fichiers/minute, surcoût de l'ordonnanceur, et si un affichage est
+disponible, blocage du thread Tk, croissance mémoire des logs et latence
+d'ajout à la liste. Les résultats sont écrits en JSON; --baseline compare
+avec un résultat précédent et signale les régressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import stat
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import fmmp_core
+
+SIZES = (10, 100, 1000, 10000)
+# Écart toléré avant de signaler une régression
+REGRESSION_THRESHOLD = 0.15
+
+
+def make_fake_ffmpeg(directory):
+    """Créer un exécutable 'ffmpeg' qui lance fake_ffmpeg.py"""
+    script = os.path.join(BENCH_DIR, 'fake_ffmpeg.py')
+    if sys.platform == 'win32':
+        path = os.path.join(directory, 'ffmpeg.cmd')
+        with open(path, 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(directory, 'ffmpeg')
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def make_inputs(directory, count):
+    files = []
+    for i in range(count):
+        path = os.path.join(directory, f"clip_{i:05d}.mp4")
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 4096)
+        files.append(path)
+    return files
+
+
+def bench_scheduler(ffmpeg, workdir, count, jobs, runtime):
+    """Débit et surcoût de l'ordonnanceur pour un lot de `count` fichiers"""
+    input_dir = tempfile.mkdtemp(dir=workdir)
+    output_dir = tempfile.mkdtemp(dir=workdir)
+    files = make_inputs(input_dir, count)
+    settings = fmmp_core.EncodeSettings(
+        ffmpeg_path=ffmpeg, video_encoder='libx264',
+        max_jobs=jobs, max_hw_jobs=jobs, max_sw_jobs=jobs
+    )
+    
+    start = time.perf_counter()
+    batch, _ = fmmp_core.prepare_jobs(settings, files, output_dir)
+    prepare = time.perf_counter() - start
+    
+    scheduler = fmmp_core.EncodeScheduler(settings.max_jobs, settings.max_hw_jobs, settings.max_sw_jobs)
+    start = time.perf_counter()
+    scheduler.run(batch)
+    wall = time.perf_counter() - start
+    
+    # Temps passé hors des processus: démarrage, lecture, attente de créneau
+    process_time = sum(job.end_time - job.start_time for job in batch)
+    ideal = process_time / jobs
+    succeeded = sum(1 for job in batch if job.status == fmmp_core.EncodeJob.SUCCESS)
+    return {
+        'files': count,
+        'jobs': jobs,
+        'succeeded': succeeded,
+        'wall_s': round(wall, 3),
+        'prepare_s': round(prepare, 4),
+        'files_per_min': round(count / wall * 60, 1),
+        'scheduler_overhead_s': round(max(0.0, wall - ideal), 3),
+        'overhead_per_job_ms': round(max(0.0, wall - ideal) / count * 1000, 2),
+        'target_runtime_s': runtime,
+    }
+
+
+def bench_gui(ffmpeg, workdir, count, jobs):
+    """Blocage du thread Tk et croissance des logs pendant un lot"""
+    import tkinter as tk
+    from unittest import mock
+    import fmmp
+    
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    input_dir = tempfile.mkdtemp(dir=workdir)
+    output_dir = tempfile.mkdtemp(dir=workdir)
+    files = make_inputs(input_dir, count)
+    
+    with mock.patch.object(fmmp.messagebox, 'showwarning'), \
+            mock.patch.object(fmmp.messagebox, 'showinfo'), \
+            mock.patch.object(fmmp.ProbePool, 'request'):
+        app = fmmp.FFmpegNVENCGUI(root)
+        app.ffmpeg_path.set(ffmpeg)
+        app.video_encoder.set('libx264')
+        app.max_jobs.set(jobs)
+        app.max_sw_jobs.set(jobs)
+        app.output_folder = output_dir
+        app.ffmpeg_available = True
+        
+        start = time.perf_counter()
+        app.add_file_entries([(path, os.stat(path)) for path in files])
+        add_latency = time.perf_counter() - start
+        
+        tracemalloc.start()
+        gaps = []
+        last = [time.perf_counter()]
+        
+        def tick():
+            now = time.perf_counter()
+            gaps.append(now - last[0])
+            last[0] = now
+            if app.is_processing or not gaps or len(gaps) < 5:
+                root.after(10, tick)
+            else:
+                root.quit()
+        
+        start = time.perf_counter()
+        app.start_conversion()
+        root.after(10, tick)
+        root.mainloop()
+        wall = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        app.drain_logs(reschedule=False)
+        log_lines = app.log_lines
+        spill_size = os.path.getsize(app.log_spill.name)
+        app.on_close()
+    
+    return {
+        'files': count,
+        'add_files_ms': round(add_latency * 1000, 1),
+        'wall_s': round(wall, 3),
+        'ui_max_stall_ms': round((max(gaps) - 0.010) * 1000, 1) if gaps else None,
+        'ui_total_stall_ms': round(sum(max(0.0, g - 0.010) for g in gaps) * 1000, 1),
+        'log_widget_lines': log_lines,
+        'log_spill_bytes': spill_size,
+        'python_mem_peak_kb': round(peak / 1024, 1),
+        'python_mem_end_kb': round(current / 1024, 1),
+    }
+
+
+def compare(results, baseline):
+    """Signaler les mesures qui se sont dégradées par rapport à la référence"""
+    regressions = []
+    lower_is_better = ('wall_s', 'scheduler_overhead_s', 'overhead_per_job_ms', 'ui_max_stall_ms',
+                       'ui_total_stall_ms', 'python_mem_peak_kb', 'add_files_ms')
+    for section in ('scheduler', 'gui'):
+        old_rows = {row['files']: row for row in baseline.get(section) or []}
+        for row in results.get(section) or []:
+            old = old_rows.get(row['files'])
+            if not old:
+                continue
+            for key, value in row.items():
+                before = old.get(key)
+                if not isinstance(value, (int, float)) or not before:
+                    continue
+                if key == 'files_per_min':
+                    change = (before - value) / before
+                elif key in lower_is_better:
+                    change = (value - before) / before
+                else:
+                    continue
+                if change > REGRESSION_THRESHOLD:
+                    regressions.append(f"{section}[{row['files']}].{key}: {before} -> {value} (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--runtime', type=float, default=0.05, help="durée simulée d'un encodage (s)")
+    parser.add_argument('--stderr-lines', type=int, default=5, help="lignes de stderr par bloc de progression")
+    parser.add_argument('--gui-size', type=int, default=200, help="taille du lot pour la mesure Tk (0 = ignorer)")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help="résultat précédent à comparer")
+    args = parser.parse_args()
+    
+    os.environ['FAKE_FFMPEG_RUNTIME'] = str(args.runtime)
+    os.environ['FAKE_FFMPEG_RATE'] = str(max(2.0, 10 / args.runtime))
+    os.environ['FAKE_FFMPEG_STDERR'] = str(args.stderr_lines)
+    
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scheduler': [],
+        'gui': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='fmmp-bench-') as workdir:
+        ffmpeg = make_fake_ffmpeg(workdir)
+        for count in args.sizes:
+            row = bench_scheduler(ffmpeg, workdir, count, args.jobs, args.runtime)
+            results['scheduler'].append(row)
+            print(f"ordonnanceur {count:>6} fichiers: {row['files_per_min']:>9} fichiers/min, "
+                  f"surcoût {row['overhead_per_job_ms']} ms/travail", flush=True)
+        if args.gui_size:
+            row = bench_gui(ffmpeg, workdir, args.gui_size, args.jobs)
+            if row is None:
+                print("interface: pas d'affichage, mesure ignorée")
+            else:
+                results['gui'].append(row)
+                print(f"interface {args.gui_size} fichiers: blocage max {row['ui_max_stall_ms']} ms, "
+                      f"mémoire max {row['python_mem_peak_kb']} Ko", flush=True)
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Résultats: {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"RÉGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Mesure de la latence d'ajout/suppression dans la liste des fichiers
+Nécessite un affichage (la fenêtre Tk est créée puis masquée)
+"""
+
+import os
+import sys
+import time
+import tkinter as tk
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import fmmp
+
+SIZES = (1000, 10000, 50000)
+
+
+class FakeStat:
+    st_size = 123456789
+    st_mtime = 0.0
+
+
+def bench(app, count):
+    entries = [(f"/bench/dossier/video_{i:06d}.mp4", FakeStat()) for i in range(count)]
+    
+    start = time.perf_counter()
+    app.add_file_entries(entries)
+    app.root.update_idletasks()
+    add_all = time.perf_counter() - start
+    
+    # Ajout d'un seul fichier dans une liste déjà pleine
+    start = time.perf_counter()
+    app.add_file_entries([("/bench/dossier/extra.mp4", FakeStat())])
+    add_one = time.perf_counter() - start
+    
+    # Suppression d'une sélection de 100 lignes au milieu de la liste
+    items = list(app.input_files.values())
+    middle = len(items) // 2
+    app.file_tree.selection_set(items[middle:middle + 100])
+    start = time.perf_counter()
+    app.remove_selected_file()
+    remove_100 = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    app.file_tree.delete(*app.input_files.values())
+    app.input_files.clear()
+    clear = time.perf_counter() - start
+    
+    return add_all, add_one, remove_100, clear
+
+
+def main():
+    root = tk.Tk()
+    root.withdraw()
+    # Pas d'appel à ffprobe ni de boîte de dialogue pendant la mesure
+    with mock.patch.object(fmmp.ProbePool, 'request'), \
+            mock.patch.object(fmmp.MediaInfoCache, 'get', return_value=None), \
+            mock.patch.object(fmmp.messagebox, 'showwarning'):
+        app = fmmp.FFmpegNVENCGUI(root)
+        print(f"{'fichiers':>10} {'ajout lot':>12} {'ajout 1':>12} {'suppr. 100':>12} {'tout effacer':>14}")
+        for count in SIZES:
+            add_all, add_one, remove_100, clear = bench(app, count)
+            print(f"{count:>10} {add_all * 1000:>10.1f}ms {add_one * 1000:>10.2f}ms "
+                  f"{remove_100 * 1000:>10.2f}ms {clear * 1000:>12.1f}ms")
+        app.on_close()
+
+
+if __name__ == "__main__":
+    main()
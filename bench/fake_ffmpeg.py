@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Remplaçant scriptable de FFmpeg pour les mesures de performance
+Imite la sortie -progress et le stderr de FFmpeg à un rythme contrôlé
+
+Variables d'environnement:
+    FAKE_FFMPEG_DURATION   durée simulée du média (s), défaut 60
+    FAKE_FFMPEG_RUNTIME    durée réelle de l'encodage (s), défaut 1
+    FAKE_FFMPEG_RATE       blocs de progression par seconde, défaut 2
+    FAKE_FFMPEG_STDERR     lignes de stderr supplémentaires par bloc, défaut 0
+    FAKE_FFMPEG_EXIT       code de retour, défaut 0
+    FAKE_FFMPEG_OUTPUT     taille du fichier de sortie écrit (octets), défaut 1024
+    FAKE_FFMPEG_ERROR      ligne d'erreur écrite en fin d'encodage (code de retour 1)
+    FAKE_FFMPEG_FAILURES   fichier compteur: n'échouer qu'aux N premiers lancements
+                           (« N » dans le fichier, décrémenté à chaque échec)
+    FAKE_FFMPEG_ERROR_ENCODER  n'échouer qu'avec cet encodeur (-c:v), défaut tous
+"""
+
+import fcntl
+import os
+import sys
+import time
+
+
+def env(name, default):
+    return type(default)(os.environ.get(name, default))
+
+
+def should_fail(argv):
+    """Ligne d'erreur à simuler pour ce lancement, ou None"""
+    error = os.environ.get('FAKE_FFMPEG_ERROR')
+    encoder = os.environ.get('FAKE_FFMPEG_ERROR_ENCODER')
+    if not error or '-i' not in argv:
+        return None
+    if encoder and (argv[argv.index('-c:v') + 1] if '-c:v' in argv else None) != encoder:
+        return None
+    counter = os.environ.get('FAKE_FFMPEG_FAILURES')
+    if counter:
+        # Compteur partagé entre lancements (encodages parallèles compris)
+        with open(counter, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            remaining = int(f.read().strip() or 0)
+            if remaining <= 0:
+                return None
+            f.seek(0)
+            f.truncate()
+            f.write(str(remaining - 1))
+    return error
+
+
+def main(argv):
+    if '-version' in argv:
+        print("ffmpeg version fake-bench Copyright (c) fmmp")
+        return 0
+    if '-encoders' in argv:
+        print("Encoders:\n ------\n V....D libx264              fake\n V....D h264_nvenc           fake\n"
+              " A....D aac                  fake")
+        return 0
+    if '-hwaccels' in argv or '-filters' in argv or '-h' in argv:
+        return 0
+    
+    duration = env('FAKE_FFMPEG_DURATION', 60.0)
+    runtime = env('FAKE_FFMPEG_RUNTIME', 1.0)
+    rate = env('FAKE_FFMPEG_RATE', 2.0)
+    stderr_lines = env('FAKE_FFMPEG_STDERR', 0)
+    exit_code = env('FAKE_FFMPEG_EXIT', 0)
+    output_size = env('FAKE_FFMPEG_OUTPUT', 1024)
+    error = should_fail(argv)
+    if error:
+        exit_code = exit_code or 1
+    
+    out = sys.stdout
+    err = sys.stderr
+    err.write("Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'fake.mp4':\n")
+    h, rest = divmod(duration, 3600)
+    m, s = divmod(rest, 60)
+    err.write(f"  Duration: {int(h):02d}:{int(m):02d}:{s:05.2f}, start: 0.000000, bitrate: 5000 kb/s\n")
+    err.flush()
+    
+    blocks = max(1, int(runtime * rate))
+    start = time.time()
+    for i in range(1, blocks + 1):
+        fraction = i / blocks
+        out_us = int(duration * fraction * 1000000)
+        speed = duration / runtime if runtime else 0
+        out.write(f"frame={int(duration * 25 * fraction)}\nfps={25 * speed:.1f}\n"
+                  f"bitrate=2500.0kbits/s\ntotal_size={int(output_size * fraction)}\n"
+                  f"out_time_us={out_us}\nout_time_ms={out_us}\nspeed={speed:.3g}x\n"
+                  f"progress={'end' if i == blocks else 'continue'}\n")
+        out.flush()
+        for n in range(stderr_lines):
+            err.write(f"[libx264 @ 0x5555] bloc {i} ligne {n}: qp=23 size=1234\n")
+        err.flush()
+        if error and i == blocks:
+            err.write(error + "\n")
+            err.flush()
+        # Respecter la durée réelle demandée
+        delay = start + runtime * fraction - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    
+    if exit_code == 0 and argv and not argv[-1].startswith('-'):
+        target = argv[-1]
+        if target not in ('-', os.devnull) and not target.startswith('pipe:'):
+            with open(target, 'wb') as f:
+                f.write(b'\0' * output_size)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -4,13 +4,52 @@ Interface Graphique FFmpeg NVENC - Version Corrigée
 Python 3 requis - Interface pour l'encodage vidéo avec NVIDIA NVENC
 """
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, scrolledtext
+except ImportError:
+    # tkinter n'est pas nécessaire pour les modes batch et serve (fmmp.py batch ...)
+    tk = None
 import os
+import queue
+import shutil
 import sys
-import subprocess
+import tempfile
 import threading
-from pathlib import Path
+import time
+
+from fmmp_core import (
+    EncodeJob, EncodeScheduler, EncodeSettings, JobManifest, MediaInfoCache, PresetStore, ProbePool,
+    MANIFEST_NAME, QUALITY_METRICS, VIDEO_ENCODERS, format_eta, get_config_dir, get_ffprobe_path,
+    load_capabilities, make_stager, make_watcher, prepare_jobs, retry_message, run_cli, sample_process,
+    scan_videos, validate_settings, write_run_report,
+)
+from fmmp_server import RemoteScheduler, run_server
+
+
+# Nombre de lignes conservées dans le widget de logs (le reste est sur disque)
+LOG_MAX_LINES = 5000
+# Intervalle de vidage de la file de logs vers le widget (ms)
+LOG_TICK_MS = 100
+
+# Nombre de fichiers trouvés envoyés à la liste en un seul lot
+SCAN_CHUNK_SIZE = 500
+
+# Intervalle de recalcul des heures de fin estimées de la liste (s)
+ETA_REFRESH_S = 2
+
+# Colonnes de la liste remplies à partir des métadonnées ffprobe
+MEDIA_COLUMNS = ('duration', 'codec', 'resolution', 'fps', 'bitrate', 'streams')
+
+# Libellés de la colonne État de la liste
+STATUS_LABELS = {
+    'pending': "En attente",
+    'running': "En cours",
+    'success': "✓ Terminé",
+    'failed': "✗ Échec",
+    'stopped': "⏹ Arrêté",
+    'skipped': "⏭ À jour",
+}
 
 class FFmpegNVENCGUI:
     def __init__(self, root):
@@ -20,34 +59,131 @@ class FFmpegNVENCGUI:
         self.root.minsize(900, 700)
         
         # Variables
-        self.input_files = []
+        # Fichiers d'entrée: chemin -> identifiant de ligne du Treeview (ordre d'ajout)
+        self.input_files = {}
+        # Priorités et fichiers épinglés (appliqués aussi pendant un lot)
+        self.file_priorities = {}
+        self.pinned_files = set()
+        self.eta_shown = {}
+        self.eta_updated = 0.0
         self.output_folder = ""
         self.is_processing = False
-        self.current_process = None
+        # Vrai du lancement d'un lot jusqu'à conversion_finished, arrêt compris
+        self.batch_running = False
+        self.scheduler = None
+        self.manifest = None
+        
+        # Logs: file alimentée par tous les threads, vidée par le thread Tk
+        self.log_queue = queue.Queue()
+        self.log_lines = 0
+        self.log_spill = tempfile.NamedTemporaryFile(
+            mode='w+', encoding='utf-8', prefix='ffmpguipy-', suffix='.log', delete=False
+        )
         
-        # Vérifier FFmpeg
-        self.check_ffmpeg()
+        # Appels à exécuter dans le thread Tk (résultats des threads de travail)
+        self.ui_queue = queue.Queue()
+        
+        # Capacités de FFmpeg, détectées en arrière-plan après l'affichage
+        self.ffmpeg_available = False
+        self.nvenc_available = False
+        self.capabilities = {}
+        
+        # Analyse de dossier en arrière-plan
+        self.scan_cancel = None
+        self.scan_count = 0
+        
+        # Dossier surveillé: ses nouveaux fichiers stables rejoignent la liste et le lot en cours
+        self.watcher = None
+        self.batch_settings = None
+        self.batch_files = []
+        self.batch_skipped = []
+        
+        # Présets nommés et paramètres de la dernière session
+        self.preset_store = PresetStore()
+        self.last_settings_path = os.path.join(get_config_dir(), 'last_settings.json')
+        
+        # Cache des métadonnées ffprobe
+        self.media_cache = MediaInfoCache()
+        self.probe_pool = ProbePool(
+            self.media_cache,
+            on_result=lambda path, info: self.call_in_ui(self.update_file_row, path, info)
+        )
         
         self.setup_ui()
-        
-    def check_ffmpeg(self):
-        """Vérifier si FFmpeg est disponible"""
         try:
-            result = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True, timeout=5)
-            if 'ffmpeg version' in result.stdout:
-                self.ffmpeg_available = True
-                # Détecter NVENC
-                result = subprocess.run(['ffmpeg', '-encoders'], 
-                                      capture_output=True, text=True)
-                self.nvenc_available = 'nvenc' in result.stdout.lower()
-            else:
-                self.ffmpeg_available = False
-                self.nvenc_available = False
-        except:
-            self.ffmpeg_available = False
-            self.nvenc_available = False
-            
+            self.apply_settings(EncodeSettings.load(self.last_settings_path))
+        except (OSError, ValueError):
+            pass
+        self.check_ffmpeg()
+        self.root.after(LOG_TICK_MS, self.drain_logs)
+        self.root.after(LOG_TICK_MS, self.process_ui_queue)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def on_close(self):
+        """Fermer la fenêtre et supprimer le fichier de logs temporaire"""
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.watcher:
+            self.watcher.stop()
+        try:
+            self.get_settings().save(self.last_settings_path)
+        except (OSError, ValueError, tk.TclError):
+            pass
+        self.probe_pool.shutdown()
+        self.log_spill.close()
+        try:
+            os.remove(self.log_spill.name)
+        except OSError:
+            pass
+        self.root.destroy()
+        
+    def call_in_ui(self, func, *args):
+        """Planifier un appel dans le thread Tk depuis un autre thread"""
+        self.ui_queue.put((func, args))
+    
+    def process_ui_queue(self):
+        try:
+            while True:
+                func, args = self.ui_queue.get_nowait()
+                func(*args)
+        except queue.Empty:
+            pass
+        self.root.after(LOG_TICK_MS, self.process_ui_queue)
+        
+    def check_ffmpeg(self, event=None):
+        """Vérifier si FFmpeg est disponible (en arrière-plan)"""
+        self.ffmpeg_status_label.config(text="FFmpeg: vérification…", foreground='#7f8c8d')
+        thread = threading.Thread(target=self.detect_ffmpeg, args=(self.ffmpeg_path.get(),))
+        thread.daemon = True
+        thread.start()
+    
+    def detect_ffmpeg(self, ffmpeg_path):
+        try:
+            caps = load_capabilities(ffmpeg_path)
+        except Exception:
+            caps = {'available': False}
+        self.call_in_ui(self.capabilities_ready, caps)
+    
+    def capabilities_ready(self, caps):
+        """Appliquer les capacités détectées à l'interface"""
+        self.capabilities = caps
+        self.ffmpeg_available = caps['available']
+        encoders = caps.get('encoders', [])
+        self.nvenc_available = any('nvenc' in name for name in encoders)
+        
+        # Status FFmpeg
+        status_color = '#27ae60' if self.ffmpeg_available else '#e74c3c'
+        nvenc_status = "✓ NVENC disponible" if self.nvenc_available else "✗ NVENC non disponible"
+        status_text = f"FFmpeg: {'✓' if self.ffmpeg_available else '✗'} | {nvenc_status}"
+        self.ffmpeg_status_label.config(text=status_text, foreground=status_color)
+        
+        if self.ffmpeg_available:
+            available = [name for name in VIDEO_ENCODERS if name in encoders]
+            if available:
+                self.encoder_combo['values'] = available
+            self.update_preset_values()
+        self.update_convert_button()
+        
         if not self.ffmpeg_available:
             messagebox.showwarning(
                 "FFmpeg non trouvé",
@@ -55,6 +191,12 @@ class FFmpegNVENCGUI:
                 "Veuillez installer FFmpeg pour utiliser cette application."
             )
     
+    def update_preset_values(self, *args):
+        """Proposer les présets supportés par l'encodeur choisi"""
+        presets = self.capabilities.get('presets', {}).get(self.video_encoder.get())
+        if presets:
+            self.preset_combo['values'] = presets
+    
     def setup_ui(self):
         # Frame principal
         main_frame = ttk.Frame(self.root, padding="15")
@@ -71,17 +213,14 @@ class FFmpegNVENCGUI:
             foreground='#2c3e50'
         ).pack(side=tk.LEFT)
         
-        # Status FFmpeg
-        status_color = '#27ae60' if self.ffmpeg_available else '#e74c3c'
-        nvenc_status = "✓ NVENC disponible" if self.nvenc_available else "✗ NVENC non disponible"
-        status_text = f"FFmpeg: {'✓' if self.ffmpeg_available else '✗'} | {nvenc_status}"
-        
-        ttk.Label(
+        # Status FFmpeg (rempli par capabilities_ready)
+        self.ffmpeg_status_label = ttk.Label(
             title_frame,
-            text=status_text,
-            foreground=status_color,
+            text="FFmpeg: vérification…",
+            foreground='#7f8c8d',
             font=('Arial', 10, 'bold')
-        ).pack(side=tk.RIGHT)
+        )
+        self.ffmpeg_status_label.pack(side=tk.RIGHT)
         
         # Notebook (onglets)
         notebook = ttk.Notebook(main_frame)
@@ -115,32 +254,68 @@ class FFmpegNVENCGUI:
             command=self.add_video_files
         ).pack(side=tk.LEFT, padx=(0, 10))
         
-        ttk.Button(
+        self.add_folder_btn = ttk.Button(
             btn_frame,
             text="📁 Ajouter un dossier",
             command=self.add_video_folder
-        ).pack(side=tk.LEFT, padx=(0, 10))
+        )
+        self.add_folder_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.watch_btn = ttk.Button(
+            btn_frame,
+            text="👁 Surveiller un dossier",
+            command=self.toggle_watch_folder
+        )
+        self.watch_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(
             btn_frame,
             text="🗑️ Tout effacer",
             command=self.clear_files
-        ).pack(side=tk.LEFT)
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        
+        # Analyse de dossier en cours
+        self.scan_cancel_btn = ttk.Button(
+            btn_frame,
+            text="✖ Annuler l'analyse",
+            command=self.cancel_scan
+        )
+        self.scan_label = ttk.Label(btn_frame, text="", foreground='#7f8c8d')
+        self.scan_label.pack(side=tk.RIGHT)
         
         # Liste des fichiers
         list_frame = ttk.Frame(input_frame)
         list_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        columns = ('filename', 'path', 'size')
-        self.file_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=8)
+        columns = ('filename', 'path', 'size', 'duration', 'codec', 'resolution', 'fps', 'bitrate', 'streams', 'status',
+                   'priority', 'eta')
+        self.file_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=8, selectmode='extended')
         
         self.file_tree.heading('filename', text='Nom du fichier')
         self.file_tree.heading('path', text='Chemin')
         self.file_tree.heading('size', text='Taille')
-        
-        self.file_tree.column('filename', width=250)
-        self.file_tree.column('path', width=400)
-        self.file_tree.column('size', width=100)
+        self.file_tree.heading('duration', text='Durée')
+        self.file_tree.heading('codec', text='Codecs')
+        self.file_tree.heading('resolution', text='Résolution')
+        self.file_tree.heading('fps', text='FPS')
+        self.file_tree.heading('bitrate', text='Débit')
+        self.file_tree.heading('streams', text='Flux')
+        self.file_tree.heading('status', text='État')
+        self.file_tree.heading('priority', text='Priorité')
+        self.file_tree.heading('eta', text='Fin estimée')
+        
+        self.file_tree.column('filename', width=200)
+        self.file_tree.column('path', width=250)
+        self.file_tree.column('size', width=80)
+        self.file_tree.column('duration', width=70)
+        self.file_tree.column('codec', width=90)
+        self.file_tree.column('resolution', width=80)
+        self.file_tree.column('fps', width=50)
+        self.file_tree.column('bitrate', width=80)
+        self.file_tree.column('streams', width=70)
+        self.file_tree.column('status', width=80)
+        self.file_tree.column('priority', width=60)
+        self.file_tree.column('eta', width=80)
         
         # Scrollbar
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.file_tree.yview)
@@ -151,6 +326,10 @@ class FFmpegNVENCGUI:
         
         # Menu contextuel
         self.context_menu = tk.Menu(self.root, tearoff=0)
+        self.context_menu.add_command(label="⬆ Priorité +1", command=lambda: self.change_priority(1))
+        self.context_menu.add_command(label="⬇ Priorité -1", command=lambda: self.change_priority(-1))
+        self.context_menu.add_command(label="📌 Épingler / désépingler", command=self.toggle_pin)
+        self.context_menu.add_separator()
         self.context_menu.add_command(label="🗑️ Supprimer", command=self.remove_selected_file)
         self.file_tree.bind("<Button-3>", self.show_context_menu)
         
@@ -195,16 +374,41 @@ class FFmpegNVENCGUI:
         )
         self.stop_btn.pack(side=tk.LEFT, padx=(0, 10))
         
-        self.progress = ttk.Progressbar(action_frame, mode='indeterminate')
+        self.progress = ttk.Progressbar(action_frame, mode='determinate', maximum=100)
         self.progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
         
         self.progress_label = ttk.Label(action_frame, text="Prêt")
         self.progress_label.pack(side=tk.LEFT)
         
+        # Travaux en cours: débit et ressources de chaque processus FFmpeg
+        columns = ('job', 'progress', 'eta', 'fps', 'speed', 'bitrate', 'rss', 'cpu')
+        self.active_tree = ttk.Treeview(conv_frame, columns=columns, show='headings', height=4)
+        for column, title, width in (('job', 'Travail', 250), ('progress', '%', 50), ('eta', 'Reste', 70),
+                                     ('fps', 'FPS', 60), ('speed', 'Vitesse', 60), ('bitrate', 'Débit', 110),
+                                     ('rss', 'Mémoire', 80), ('cpu', 'CPU', 60)):
+            self.active_tree.heading(column, text=title)
+            self.active_tree.column(column, width=width)
+        self.active_tree.pack(fill=tk.X)
+        self.active_rows = {}
+        self.cpu_samples = {}
+        
     def setup_conversion_settings(self, parent):
+        defaults = EncodeSettings()
         settings_frame = ttk.LabelFrame(parent, text="⚙️ Paramètres de conversion", padding="10")
         settings_frame.pack(fill=tk.X, pady=(0, 15))
         
+        # Présets enregistrés
+        preset_frame = ttk.Frame(settings_frame)
+        preset_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(preset_frame, text="Préset:").pack(side=tk.LEFT)
+        self.preset_name = tk.StringVar()
+        self.preset_name_combo = ttk.Combobox(preset_frame, textvariable=self.preset_name,
+                                              values=self.preset_store.names(), width=25)
+        self.preset_name_combo.pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Button(preset_frame, text="Charger", command=self.load_preset).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(preset_frame, text="Enregistrer", command=self.save_preset).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(preset_frame, text="Supprimer", command=self.delete_preset).pack(side=tk.LEFT)
+        
         # Notebook pour les paramètres
         settings_notebook = ttk.Notebook(settings_frame)
         settings_notebook.pack(fill=tk.X)
@@ -215,48 +419,71 @@ class FFmpegNVENCGUI:
         
         # Encodeur vidéo
         ttk.Label(codec_frame, text="Encodeur vidéo:").grid(row=0, column=0, sticky='w', pady=5)
-        self.video_encoder = tk.StringVar(value="h264_nvenc")
-        encoder_combo = ttk.Combobox(codec_frame, textvariable=self.video_encoder)
-        encoder_combo['values'] = ('h264_nvenc', 'hevc_nvenc', 'av1_nvenc')
-        encoder_combo.grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        self.video_encoder = tk.StringVar(value=defaults.video_encoder)
+        self.encoder_combo = ttk.Combobox(codec_frame, textvariable=self.video_encoder)
+        self.encoder_combo['values'] = ('h264_nvenc', 'hevc_nvenc', 'av1_nvenc')
+        self.encoder_combo.grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        self.video_encoder.trace('w', self.update_preset_values)
         
         # Qualité
         ttk.Label(codec_frame, text="Qualité (CRF):").grid(row=1, column=0, sticky='w', pady=5)
         quality_frame = ttk.Frame(codec_frame)
         quality_frame.grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
         
-        self.crf = tk.IntVar(value=23)
+        self.crf = tk.IntVar(value=defaults.crf)
         ttk.Scale(quality_frame, from_=0, to=51, variable=self.crf, orient=tk.HORIZONTAL).pack(side=tk.LEFT)
-        self.crf_label = ttk.Label(quality_frame, text="23")
+        self.crf_label = ttk.Label(quality_frame, text=str(defaults.crf))
         self.crf_label.pack(side=tk.LEFT, padx=(10, 0))
         self.crf.trace('w', self.update_crf_label)
         
         # Débit max
         ttk.Label(codec_frame, text="Débit max (kbps):").grid(row=2, column=0, sticky='w', pady=5)
-        self.max_bitrate = tk.StringVar(value="0")
+        self.max_bitrate = tk.StringVar(value=defaults.max_bitrate)
         ttk.Entry(codec_frame, textvariable=self.max_bitrate).grid(row=2, column=1, sticky='w', pady=5, padx=(10, 0))
         ttk.Label(codec_frame, text="0 = illimité").grid(row=2, column=2, sticky='w', pady=5, padx=(5, 0))
         
         # Présets
         ttk.Label(codec_frame, text="Préset NVENC:").grid(row=3, column=0, sticky='w', pady=5)
-        self.preset = tk.StringVar(value="medium")
-        preset_combo = ttk.Combobox(codec_frame, textvariable=self.preset)
-        preset_combo['values'] = ('p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7')
-        preset_combo.grid(row=3, column=1, sticky='w', pady=5, padx=(10, 0))
+        self.preset = tk.StringVar(value=defaults.preset)
+        self.preset_combo = ttk.Combobox(codec_frame, textvariable=self.preset)
+        self.preset_combo['values'] = ('p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7')
+        self.preset_combo.grid(row=3, column=1, sticky='w', pady=5, padx=(10, 0))
         ttk.Label(codec_frame, text="(p1=rapide, p7=meilleure qualité)").grid(row=3, column=2, sticky='w', pady=5, padx=(5, 0))
         
+        # Qualité cible (remplace le CRF fixe)
+        ttk.Label(codec_frame, text="Qualité cible:").grid(row=4, column=0, sticky='w', pady=5)
+        target_frame = ttk.Frame(codec_frame)
+        target_frame.grid(row=4, column=1, sticky='w', pady=5, padx=(10, 0))
+        self.target_quality = tk.DoubleVar(value=defaults.target_quality)
+        ttk.Entry(target_frame, width=6, textvariable=self.target_quality).pack(side=tk.LEFT)
+        self.quality_metric = tk.StringVar(value=defaults.quality_metric)
+        ttk.Combobox(target_frame, textvariable=self.quality_metric, values=QUALITY_METRICS,
+                     width=5, state='readonly').pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(codec_frame, text="0 = CRF fixe; ex: VMAF 93, SSIM 0.98").grid(row=4, column=2, sticky='w', pady=5, padx=(5, 0))
+        
+        ttk.Label(codec_frame, text="Échantillons:").grid(row=5, column=0, sticky='w', pady=5)
+        samples_frame = ttk.Frame(codec_frame)
+        samples_frame.grid(row=5, column=1, sticky='w', pady=5, padx=(10, 0))
+        self.quality_samples = tk.IntVar(value=defaults.quality_samples)
+        ttk.Spinbox(samples_frame, from_=1, to=10, width=4, textvariable=self.quality_samples).pack(side=tk.LEFT)
+        ttk.Label(samples_frame, text="de").pack(side=tk.LEFT, padx=(5, 0))
+        self.quality_sample_duration = tk.IntVar(value=defaults.quality_sample_duration)
+        ttk.Spinbox(samples_frame, from_=1, to=30, width=4, textvariable=self.quality_sample_duration).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(samples_frame, text="s").pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(codec_frame, text="encodés en parallèle, résultat mis en cache").grid(row=5, column=2, sticky='w', pady=5, padx=(5, 0))
+        
         # Onglet Audio
         audio_frame = ttk.Frame(settings_notebook, padding="10")
         settings_notebook.add(audio_frame, text="Audio")
         
         ttk.Label(audio_frame, text="Codec audio:").grid(row=0, column=0, sticky='w', pady=5)
-        self.audio_codec = tk.StringVar(value="aac")
+        self.audio_codec = tk.StringVar(value=defaults.audio_codec)
         audio_combo = ttk.Combobox(audio_frame, textvariable=self.audio_codec)
         audio_combo['values'] = ('aac', 'ac3', 'mp3', 'copy')
         audio_combo.grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
         
         ttk.Label(audio_frame, text="Débit audio (kbps):").grid(row=1, column=0, sticky='w', pady=5)
-        self.audio_bitrate = tk.StringVar(value="128")
+        self.audio_bitrate = tk.StringVar(value=defaults.audio_bitrate)
         ttk.Entry(audio_frame, textvariable=self.audio_bitrate).grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
         
         # Onglet Filtres
@@ -264,19 +491,25 @@ class FFmpegNVENCGUI:
         settings_notebook.add(filters_frame, text="Filtres")
         
         ttk.Label(filters_frame, text="Échelle (width:height):").grid(row=0, column=0, sticky='w', pady=5)
-        self.scale = tk.StringVar()
+        self.scale = tk.StringVar(value=defaults.scale)
         ttk.Entry(filters_frame, textvariable=self.scale).grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
         ttk.Label(filters_frame, text="ex: 1920:1080, 1280:720").grid(row=0, column=2, sticky='w', pady=5, padx=(5, 0))
         
         ttk.Label(filters_frame, text="FPS:").grid(row=1, column=0, sticky='w', pady=5)
-        self.fps = tk.StringVar()
+        self.fps = tk.StringVar(value=defaults.fps)
         ttk.Entry(filters_frame, textvariable=self.fps).grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
         
         ttk.Label(filters_frame, text="Filtres supplémentaires:").grid(row=2, column=0, sticky='w', pady=5)
-        self.extra_filters = tk.StringVar()
+        self.extra_filters = tk.StringVar(value=defaults.extra_filters)
         ttk.Entry(filters_frame, textvariable=self.extra_filters).grid(row=2, column=1, columnspan=2, sticky='w', pady=5, padx=(10, 0))
         
+        ttk.Label(filters_frame, text="Paliers (un seul décodage):").grid(row=3, column=0, sticky='w', pady=5)
+        self.ladder = tk.StringVar(value=defaults.ladder)
+        ttk.Entry(filters_frame, textvariable=self.ladder).grid(row=3, column=1, sticky='w', pady=5, padx=(10, 0))
+        ttk.Label(filters_frame, text="hauteur[:débit max], ex: 1080:6000, 720:3000, 480").grid(row=3, column=2, sticky='w', pady=5, padx=(5, 0))
+        
     def setup_settings_tab(self, notebook):
+        defaults = EncodeSettings()
         settings_frame = ttk.Frame(notebook, padding="15")
         notebook.add(settings_frame, text="🔧 Paramètres")
         
@@ -285,25 +518,112 @@ class FFmpegNVENCGUI:
         general_frame.pack(fill=tk.X, pady=(0, 15))
         
         ttk.Label(general_frame, text="Chemin FFmpeg:").grid(row=0, column=0, sticky='w', pady=5)
-        self.ffmpeg_path = tk.StringVar(value="ffmpeg")
-        ttk.Entry(general_frame, textvariable=self.ffmpeg_path).grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        self.ffmpeg_path = tk.StringVar(value=defaults.ffmpeg_path)
+        ffmpeg_entry = ttk.Entry(general_frame, textvariable=self.ffmpeg_path)
+        ffmpeg_entry.grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        ffmpeg_entry.bind('<Return>', self.check_ffmpeg)
         
         ttk.Label(general_frame, text="Suffixe des fichiers de sortie:").grid(row=1, column=0, sticky='w', pady=5)
-        self.output_suffix = tk.StringVar(value="_encoded")
+        self.output_suffix = tk.StringVar(value=defaults.output_suffix)
         ttk.Entry(general_frame, textvariable=self.output_suffix).grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
         
         # Paramètres avancés
         advanced_frame = ttk.LabelFrame(settings_frame, text="Paramètres avancés", padding="10")
         advanced_frame.pack(fill=tk.X, pady=(0, 15))
         
-        self.overwrite = tk.BooleanVar(value=True)
+        self.overwrite = tk.BooleanVar(value=defaults.overwrite)
         ttk.Checkbutton(advanced_frame, text="Écraser les fichiers existants", variable=self.overwrite).pack(anchor='w', pady=2)
         
-        self.keep_structure = tk.BooleanVar(value=False)
+        self.keep_structure = tk.BooleanVar(value=defaults.keep_structure)
         ttk.Checkbutton(advanced_frame, text="Conserver la structure des dossiers", variable=self.keep_structure).pack(anchor='w', pady=2)
         
-        self.two_pass = tk.BooleanVar(value=False)
-        ttk.Checkbutton(advanced_frame, text="Encodage en deux passes", variable=self.two_pass).pack(anchor='w', pady=2)
+        self.two_pass = tk.BooleanVar(value=defaults.two_pass)
+        ttk.Checkbutton(advanced_frame, text="Encodage en deux passes (NVENC: multipass; logiciel: débit max comme débit cible)", variable=self.two_pass).pack(anchor='w', pady=2)
+        
+        first_pass_frame = ttk.Frame(advanced_frame)
+        first_pass_frame.pack(anchor='w', pady=2, padx=(20, 0))
+        ttk.Label(first_pass_frame, text="Préset de la passe d'analyse:").pack(side=tk.LEFT)
+        self.first_pass_preset = tk.StringVar(value=defaults.first_pass_preset)
+        ttk.Combobox(first_pass_frame, textvariable=self.first_pass_preset, width=10,
+                     values=('', 'ultrafast', 'superfast', 'veryfast', 'faster', 'fast')).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(first_pass_frame, text="vide = même préset").pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.hw_pipeline = tk.BooleanVar(value=defaults.hw_pipeline)
+        ttk.Checkbutton(advanced_frame, text="Décodage et mise à l'échelle sur le GPU si possible (CUDA)", variable=self.hw_pipeline).pack(anchor='w', pady=2)
+        
+        self.smart_copy = tk.BooleanVar(value=defaults.smart_copy)
+        ttk.Checkbutton(advanced_frame, text="Copie intelligente (copier les flux déjà au bon codec au lieu de les ré-encoder)", variable=self.smart_copy).pack(anchor='w', pady=2)
+        
+        self.write_report = tk.BooleanVar(value=defaults.write_report)
+        ttk.Checkbutton(advanced_frame, text="Écrire un rapport de lot (JSON/CSV) dans le dossier de sortie", variable=self.write_report).pack(anchor='w', pady=2)
+        
+        ratio_frame = ttk.Frame(advanced_frame)
+        ratio_frame.pack(anchor='w', pady=2)
+        ttk.Label(ratio_frame, text="Ratio de taille estimé (sortie/entrée):").pack(side=tk.LEFT)
+        self.size_ratio = tk.DoubleVar(value=defaults.size_ratio)
+        ttk.Entry(ratio_frame, width=6, textvariable=self.size_ratio).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(ratio_frame, text="sert à réserver l'espace disque sans débit cible").pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.incremental = tk.BooleanVar(value=defaults.incremental)
+        ttk.Checkbutton(advanced_frame, text="Mode incrémental (ignorer les fichiers déjà à jour, reprendre un lot interrompu)", variable=self.incremental).pack(anchor='w', pady=2)
+        
+        # Encodage segmenté
+        segment_frame = ttk.LabelFrame(settings_frame, text="Encodage segmenté des fichiers longs", padding="10")
+        segment_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        ttk.Label(segment_frame, text="Segments par fichier:").grid(row=0, column=0, sticky='w', pady=5)
+        self.segments = tk.IntVar(value=defaults.segments)
+        ttk.Spinbox(segment_frame, from_=0, to=64, width=5, textvariable=self.segments).grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        ttk.Label(segment_frame, text="0 = désactivé; découpage aux images clés, audio en une passe").grid(row=0, column=2, sticky='w', pady=5, padx=(5, 0))
+        
+        ttk.Label(segment_frame, text="Durée minimale (s):").grid(row=1, column=0, sticky='w', pady=5)
+        self.segment_min_duration = tk.IntVar(value=defaults.segment_min_duration)
+        ttk.Entry(segment_frame, width=7, textvariable=self.segment_min_duration).grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
+        
+        # Préchargement des sources
+        stage_frame = ttk.LabelFrame(settings_frame, text="Préchargement des sources réseau (SMB/NFS)", padding="10")
+        stage_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        ttk.Label(stage_frame, text="Dossier local de travail:").grid(row=0, column=0, sticky='w', pady=5)
+        self.stage_dir = tk.StringVar(value=defaults.stage_dir)
+        ttk.Entry(stage_frame, textvariable=self.stage_dir).grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        ttk.Button(stage_frame, text="Parcourir", command=self.select_stage_dir).grid(row=0, column=2, sticky='w', pady=5, padx=(5, 0))
+        ttk.Label(stage_frame, text="vide = lecture directe des sources").grid(row=0, column=3, sticky='w', pady=5, padx=(5, 0))
+        
+        ttk.Label(stage_frame, text="Fichiers copiés d'avance:").grid(row=1, column=0, sticky='w', pady=5)
+        self.stage_ahead = tk.IntVar(value=defaults.stage_ahead)
+        ttk.Spinbox(stage_frame, from_=1, to=32, width=5, textvariable=self.stage_ahead).grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
+        
+        ttk.Label(stage_frame, text="Taille maximale (Go):").grid(row=2, column=0, sticky='w', pady=5)
+        self.stage_max_size = tk.DoubleVar(value=defaults.stage_max_size)
+        ttk.Entry(stage_frame, width=7, textvariable=self.stage_max_size).grid(row=2, column=1, sticky='w', pady=5, padx=(10, 0))
+        
+        # Serveur de travaux partagé
+        server_frame = ttk.LabelFrame(settings_frame, text="Serveur de travaux partagé", padding="10")
+        server_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        ttk.Label(server_frame, text="Adresse (hôte:port):").grid(row=0, column=0, sticky='w', pady=5)
+        self.server = tk.StringVar(value=defaults.server)
+        ttk.Entry(server_frame, textvariable=self.server).grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        ttk.Label(server_frame, text="vide = encodage local; sinon limites du serveur (fmmp.py serve)").grid(row=0, column=2, sticky='w', pady=5, padx=(5, 0))
+        
+        # Encodages simultanés
+        parallel_frame = ttk.LabelFrame(settings_frame, text="Encodages simultanés", padding="10")
+        parallel_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        ttk.Label(parallel_frame, text="Maximum total:").grid(row=0, column=0, sticky='w', pady=5)
+        self.max_jobs = tk.IntVar(value=defaults.max_jobs)
+        ttk.Spinbox(parallel_frame, from_=1, to=32, width=5, textvariable=self.max_jobs).grid(row=0, column=1, sticky='w', pady=5, padx=(10, 0))
+        
+        ttk.Label(parallel_frame, text="Maximum NVENC (matériel):").grid(row=1, column=0, sticky='w', pady=5)
+        self.max_hw_jobs = tk.IntVar(value=defaults.max_hw_jobs)
+        ttk.Spinbox(parallel_frame, from_=1, to=16, width=5, textvariable=self.max_hw_jobs).grid(row=1, column=1, sticky='w', pady=5, padx=(10, 0))
+        ttk.Label(parallel_frame, text="limité par le nombre de sessions NVENC du GPU").grid(row=1, column=2, sticky='w', pady=5, padx=(5, 0))
+        
+        ttk.Label(parallel_frame, text="Maximum logiciel:").grid(row=2, column=0, sticky='w', pady=5)
+        self.max_sw_jobs = tk.IntVar(value=defaults.max_sw_jobs)
+        ttk.Spinbox(parallel_frame, from_=1, to=32, width=5, textvariable=self.max_sw_jobs).grid(row=2, column=1, sticky='w', pady=5, padx=(10, 0))
+        ttk.Label(parallel_frame, text="segments logiciels encodés en parallèle: à augmenter avec l'encodage segmenté").grid(row=2, column=2, sticky='w', pady=5, padx=(5, 0))
         
     def setup_logs_tab(self, notebook):
         logs_frame = ttk.Frame(notebook, padding="15")
@@ -345,38 +665,176 @@ class FFmpegNVENCGUI:
             ]
         )
         if files:
-            self.input_files.extend(files)
-            self.update_file_list()
+            entries = []
+            for file_path in files:
+                try:
+                    entries.append((file_path, os.stat(file_path)))
+                except OSError:
+                    entries.append((file_path, None))
+            self.add_file_entries(entries)
     
     def add_video_folder(self):
         folder = filedialog.askdirectory(title="Sélectionner un dossier contenant des vidéos")
         if folder:
-            video_extensions = ('.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v')
-            for root, dirs, files in os.walk(folder):
-                for file in files:
-                    if file.lower().endswith(video_extensions):
-                        self.input_files.append(os.path.join(root, file))
-            self.update_file_list()
-    
-    def update_file_list(self):
-        # Vider la liste
-        for item in self.file_tree.get_children():
-            self.file_tree.delete(item)
-        
-        # Ajouter les fichiers
-        for file_path in self.input_files:
-            filename = os.path.basename(file_path)
-            try:
-                size = os.path.getsize(file_path)
-                size_str = self.format_file_size(size)
-            except:
-                size_str = "N/A"
+            self.scan_cancel = threading.Event()
+            self.scan_count = 0
+            self.add_folder_btn.config(state='disabled')
+            self.scan_cancel_btn.pack(side=tk.LEFT)
+            self.scan_label.config(text="Analyse: 0 fichier")
             
-            self.file_tree.insert('', tk.END, values=(filename, file_path, size_str))
+            thread = threading.Thread(target=self.scan_folder, args=(folder, self.scan_cancel))
+            thread.daemon = True
+            thread.start()
+    
+    def scan_folder(self, folder, cancel_event):
+        """Thread d'analyse: envoie les fichiers trouvés par lots à la liste"""
+        chunk = []
+        last_flush = time.time()
+        for entry in scan_videos(folder, cancel_event):
+            chunk.append(entry)
+            if len(chunk) >= SCAN_CHUNK_SIZE or time.time() - last_flush > 0.25:
+                self.call_in_ui(self.add_scanned_files, chunk)
+                chunk = []
+                last_flush = time.time()
+        if chunk and not cancel_event.is_set():
+            self.call_in_ui(self.add_scanned_files, chunk)
+        self.call_in_ui(self.scan_finished, cancel_event.is_set())
+    
+    def add_scanned_files(self, entries):
+        if self.scan_cancel is None or self.scan_cancel.is_set():
+            return
+        self.scan_count += len(entries)
+        self.scan_label.config(text=f"Analyse: {self.scan_count} fichiers")
+        self.add_file_entries(entries)
+    
+    def scan_finished(self, cancelled):
+        self.scan_cancel = None
+        self.add_folder_btn.config(state='normal')
+        self.scan_cancel_btn.pack_forget()
+        status = "annulée" if cancelled else "terminée"
+        self.scan_label.config(text=f"Analyse {status}: {self.scan_count} fichiers")
+    
+    def cancel_scan(self):
+        if self.scan_cancel is not None:
+            self.scan_cancel.set()
+    
+    def toggle_watch_folder(self):
+        """Surveiller un dossier (ou arrêter): ses vidéos stables sont ajoutées à la liste et au lot en cours"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+            self.watch_btn.config(text="👁 Surveiller un dossier")
+            self.log_message("Surveillance arrêtée")
+            if self.scheduler:
+                # Le lot se termine quand sa file est vide
+                self.scheduler.drain()
+            return
         
-        # Mettre à jour le bouton de conversion
+        folder = filedialog.askdirectory(title="Sélectionner le dossier à surveiller")
+        if not folder:
+            return
+        try:
+            settings = self.get_settings()
+        except tk.TclError:
+            settings = EncodeSettings()
+        self.watcher = make_watcher(
+            settings, folder, self.output_folder or folder,
+            lambda path, stat: self.call_in_ui(self.add_watched_file, path, stat),
+            self.input_files
+        )
+        self.watcher.start()
+        if self.scheduler:
+            # Le lot en cours attend désormais les nouveaux fichiers
+            self.scheduler.persistent = True
+        self.watch_btn.config(text="⏹ Arrêter la surveillance")
+        self.log_message(f"Surveillance de {self.watcher.folder} ({self.watcher.backend}): "
+                         f"fichiers ajoutés une fois leur copie terminée")
+    
+    def add_watched_file(self, file_path, stat):
+        """Fichier stable signalé par la surveillance: l'ajouter à la liste et au lot en cours"""
+        file_path = os.path.normpath(file_path)
+        if file_path in self.input_files:
+            return
+        self.add_file_entries([(file_path, stat)])
+        self.log_message(f"+ Nouveau fichier: {file_path}")
+        if self.is_processing and self.scheduler:
+            self.set_file_status(file_path, STATUS_LABELS[EncodeJob.PENDING])
+            thread = threading.Thread(target=self.submit_watched_file, args=(file_path,))
+            thread.daemon = True
+            thread.start()
+    
+    def submit_watched_file(self, file_path):
+        """Thread: préparer un fichier du dossier surveillé et l'ajouter au lot en cours"""
+        scheduler, settings = self.scheduler, self.batch_settings
+        if scheduler is None or settings is None:
+            return
+        try:
+            if settings.server:
+                jobs, skipped = scheduler.add_files([file_path])
+            else:
+                jobs, skipped = prepare_jobs(settings, [file_path], self.output_folder, self.media_cache,
+                                             self.manifest, self.capabilities)
+                scheduler.submit(jobs)
+        except (OSError, ValueError) as e:
+            self.log_message(f"✗ {os.path.basename(file_path)} non ajouté au lot: {e}")
+            return
+        self.batch_files.append(file_path)
+        self.batch_skipped.extend(skipped)
+        for job in skipped:
+            self.call_in_ui(self.set_file_status, job.input_file, STATUS_LABELS[job.status])
+    
+    def add_file_entries(self, entries):
+        """Ajouter des fichiers (chemin, stat) à la liste en ignorant les doublons"""
+        self.probe_pool.ffprobe = get_ffprobe_path(self.ffmpeg_path.get())
+        for file_path, stat in entries:
+            file_path = os.path.normpath(file_path)
+            if file_path not in self.input_files:
+                self.insert_file_row(file_path, stat)
         self.update_convert_button()
     
+    def insert_file_row(self, file_path, stat):
+        """Insérer une ligne dans la liste à partir d'un stat déjà connu"""
+        info = None
+        if stat is not None:
+            size_str = self.format_file_size(stat.st_size)
+            info = self.media_cache.get(file_path, stat)
+        else:
+            size_str = "N/A"
+        
+        values = (os.path.basename(file_path), file_path, size_str) + self.format_media_info(info) + ("", "", "")
+        self.input_files[file_path] = self.file_tree.insert('', tk.END, values=values)
+        if info is None and stat is not None:
+            self.probe_pool.request(file_path)
+    
+    def format_media_info(self, info):
+        """Valeurs des colonnes de métadonnées pour une ligne de la liste"""
+        if not info:
+            return ("…", "", "", "", "", "")
+        duration = f"{int(info['duration']) // 60}:{int(info['duration']) % 60:02d}" if info.get('duration') else ""
+        codecs = "/".join(c for c in (info.get('vcodec'), info.get('acodec')) if c)
+        resolution = f"{info['width']}x{info['height']}" if info.get('width') else ""
+        fps = f"{info['fps']:.2f}".rstrip('0').rstrip('.') if info.get('fps') else ""
+        bitrate = f"{info['bitrate'] // 1000} kb/s" if info.get('bitrate') else ""
+        return (duration, codecs, resolution, fps, bitrate, info.get('streams') or "")
+    
+    def update_file_row(self, file_path, info):
+        """Remplir les colonnes de métadonnées quand ffprobe a répondu"""
+        item = self.input_files.get(file_path)
+        if item is None:
+            return
+        values = self.format_media_info(info) if info else ("?", "", "", "", "", "")
+        for column, value in zip(MEDIA_COLUMNS, values):
+            self.file_tree.set(item, column, value)
+    
+    def set_file_status(self, file_path, status):
+        """Mettre à jour la colonne État d'une seule ligne"""
+        self.set_file_column(file_path, 'status', status)
+    
+    def set_file_column(self, file_path, column, value):
+        item = self.input_files.get(file_path)
+        if item is not None:
+            self.file_tree.set(item, column, value)
+    
     def format_file_size(self, size):
         """Formater la taille du fichier"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -388,25 +846,62 @@ class FFmpegNVENCGUI:
     def show_context_menu(self, event):
         item = self.file_tree.identify_row(event.y)
         if item:
-            self.file_tree.selection_set(item)
+            # Conserver une sélection multiple si on clique dedans
+            if item not in self.file_tree.selection():
+                self.file_tree.selection_set(item)
             self.context_menu.post(event.x_root, event.y_root)
     
+    def selected_paths(self):
+        return [self.file_tree.set(item, 'path') for item in self.file_tree.selection()]
+    
+    def show_priority(self, file_path):
+        priority = self.file_priorities.get(file_path, 0)
+        text = str(priority) if priority else ""
+        if file_path in self.pinned_files:
+            text = f"📌 {text}".strip()
+        self.set_file_column(file_path, 'priority', text)
+    
+    def change_priority(self, delta):
+        """Monter ou descendre les fichiers sélectionnés dans la file"""
+        for file_path in self.selected_paths():
+            priority = self.file_priorities.get(file_path, 0) + delta
+            self.file_priorities[file_path] = priority
+            self.show_priority(file_path)
+            if self.scheduler:
+                self.scheduler.set_priority(file_path, priority=priority)
+    
+    def toggle_pin(self):
+        """Épingler les fichiers sélectionnés en tête de file (ou les désépingler)"""
+        for file_path in self.selected_paths():
+            pinned = file_path not in self.pinned_files
+            if pinned:
+                self.pinned_files.add(file_path)
+            else:
+                self.pinned_files.discard(file_path)
+            self.show_priority(file_path)
+            if self.scheduler:
+                self.scheduler.set_priority(file_path, pinned=pinned)
+    
     def remove_selected_file(self):
         selected = self.file_tree.selection()
         if selected:
-            item = selected[0]
-            values = self.file_tree.item(item, 'values')
-            file_path = values[1]  # Le chemin est dans la deuxième colonne
-            self.input_files.remove(file_path)
-            self.file_tree.delete(item)
+            for item in selected:
+                file_path = self.file_tree.set(item, 'path')
+                self.input_files.pop(file_path, None)
+                self.file_priorities.pop(file_path, None)
+                self.pinned_files.discard(file_path)
+            self.file_tree.delete(*selected)
             self.update_convert_button()
     
     def clear_files(self):
         if self.input_files:
             result = messagebox.askyesno("Confirmation", "Voulez-vous vraiment supprimer tous les fichiers?")
             if result:
+                self.file_tree.delete(*self.input_files.values())
                 self.input_files.clear()
-                self.update_file_list()
+                self.file_priorities.clear()
+                self.pinned_files.clear()
+                self.update_convert_button()
     
     def select_output_folder(self):
         folder = filedialog.askdirectory(title="Sélectionner le dossier de sortie")
@@ -415,15 +910,23 @@ class FFmpegNVENCGUI:
             self.output_label.config(text=folder)
             self.update_convert_button()
     
+    def select_stage_dir(self):
+        folder = filedialog.askdirectory(title="Sélectionner le dossier local de préchargement")
+        if folder:
+            self.stage_dir.set(folder)
+    
     def update_convert_button(self):
         """Activer/désactiver le bouton de conversion"""
-        if self.input_files and self.output_folder and self.ffmpeg_available:
+        if self.input_files and self.output_folder and self.ffmpeg_available and not self.batch_running:
             self.convert_btn.config(state='normal')
         else:
             self.convert_btn.config(state='disabled')
     
     def clear_logs(self):
         self.log_text.delete(1.0, tk.END)
+        self.log_lines = 0
+        self.log_spill.seek(0)
+        self.log_spill.truncate()
     
     def save_logs(self):
         filename = filedialog.asksaveasfilename(
@@ -432,86 +935,104 @@ class FFmpegNVENCGUI:
             filetypes=[("Fichiers texte", "*.txt"), ("Tous les fichiers", "*.*")]
         )
         if filename:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.log_text.get(1.0, tk.END))
+            # Le fichier temporaire contient le log complet, le widget seulement la fin
+            self.drain_logs(reschedule=False)
+            self.log_spill.flush()
+            with open(self.log_spill.name, 'r', encoding='utf-8') as src, \
+                    open(filename, 'w', encoding='utf-8') as f:
+                shutil.copyfileobj(src, f)
             self.log_message(f"Logs sauvegardés: {filename}")
     
     def log_message(self, message):
-        """Ajouter un message aux logs"""
-        self.log_text.insert(tk.END, f"{message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        """Ajouter un message aux logs (utilisable depuis n'importe quel thread)"""
+        self.log_queue.put(message)
     
-    def build_ffmpeg_command(self, input_file, output_file):
-        """Construire la commande FFmpeg"""
-        cmd = [self.ffmpeg_path.get(), '-i', input_file]
-        
-        # Options vidéo
-        video_filters = []
-        
-        # Échelle
-        if self.scale.get():
-            video_filters.append(f"scale={self.scale.get()}")
-        
-        # FPS
-        if self.fps.get():
-            video_filters.append(f"fps={self.fps.get()}")
-        
-        # Filtres supplémentaires
-        if self.extra_filters.get():
-            video_filters.append(self.extra_filters.get())
-        
-        # Ajouter les filtres vidéo
-        if video_filters:
-            cmd.extend(['-vf', ','.join(video_filters)])
-        
-        # Codec vidéo
-        cmd.extend([
-            '-c:v', self.video_encoder.get(),
-            '-preset', self.preset.get(),
-            '-crf', str(self.crf.get())
-        ])
-        
-        # Débit max
-        if self.max_bitrate.get() and self.max_bitrate.get() != "0":
-            cmd.extend(['-maxrate', f"{self.max_bitrate.get()}k"])
-        
-        # Codec audio
-        if self.audio_codec.get() == 'copy':
-            cmd.extend(['-c:a', 'copy'])
-        else:
-            cmd.extend([
-                '-c:a', self.audio_codec.get(),
-                '-b:a', f"{self.audio_bitrate.get()}k"
-            ])
-        
-        # Overwrite
-        if self.overwrite.get():
-            cmd.append('-y')
-        else:
-            cmd.append('-n')
-        
-        # Fichier de sortie
-        cmd.append(output_file)
-        
-        return cmd
+    def drain_logs(self, reschedule=True):
+        """Vider la file de logs: une seule insertion par intervalle"""
+        lines = []
+        try:
+            while True:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if lines:
+            text = "\n".join(lines) + "\n"
+            self.log_spill.write(text)
+            self.log_text.insert(tk.END, text)
+            self.log_lines += text.count("\n")
+            
+            # Tampon circulaire: ne garder que les LOG_MAX_LINES dernières lignes
+            excess = self.log_lines - LOG_MAX_LINES
+            if excess > 0:
+                self.log_text.delete(1.0, f"{excess + 1}.0")
+                self.log_lines = LOG_MAX_LINES
+            self.log_text.see(tk.END)
+        
+        if reschedule:
+            self.root.after(LOG_TICK_MS, self.drain_logs)
     
-    def get_output_filename(self, input_file):
-        """Générer le nom de fichier de sortie"""
-        input_path = Path(input_file)
-        suffix = self.output_suffix.get()
-        output_filename = f"{input_path.stem}{suffix}{input_path.suffix}"
-        
-        if self.keep_structure.get():
-            # Conserver la structure des dossiers
-            relative_path = input_path.relative_to(input_path.anchor)
-            output_path = Path(self.output_folder) / relative_path.parent / output_filename
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-        else:
-            # Juste dans le dossier de sortie
-            output_path = Path(self.output_folder) / output_filename
-        
-        return str(output_path)
+    def get_settings(self):
+        """Lire les paramètres de l'interface dans un EncodeSettings"""
+        return EncodeSettings(**{key: getattr(self, key).get() for key in EncodeSettings.DEFAULTS})
+    
+    def apply_settings(self, settings):
+        """Afficher un EncodeSettings dans l'interface"""
+        for key, value in settings.to_dict().items():
+            getattr(self, key).set(value)
+    
+    def checked_settings(self):
+        """Paramètres de l'interface s'ils sont valides, sinon None (erreurs affichées)"""
+        try:
+            settings = self.get_settings()
+        except tk.TclError as e:
+            messagebox.showerror("Paramètres invalides", f"Valeur numérique invalide: {e}")
+            return None
+        errors = validate_settings(settings, self.capabilities)
+        if errors:
+            messagebox.showerror("Paramètres invalides", "\n".join(errors))
+            return None
+        return settings
+    
+    def load_preset(self):
+        name = self.preset_name.get().strip()
+        try:
+            settings = self.preset_store.load(name)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Préset", f"Impossible de charger « {name} »: {e}")
+            return
+        errors = validate_settings(settings, self.capabilities)
+        if errors:
+            messagebox.showerror("Préset invalide", f"« {name} »:\n" + "\n".join(errors))
+            return
+        self.apply_settings(settings)
+        self.check_ffmpeg()
+        self.log_message(f"Préset chargé: {name}")
+    
+    def save_preset(self):
+        name = self.preset_name.get().strip()
+        settings = self.checked_settings()
+        if settings is None:
+            return
+        try:
+            self.preset_store.save(name, settings)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Préset", str(e))
+            return
+        self.preset_name_combo['values'] = self.preset_store.names()
+        self.log_message(f"Préset enregistré: {name}")
+    
+    def delete_preset(self):
+        name = self.preset_name.get().strip()
+        if not name or not messagebox.askyesno("Préset", f"Supprimer le préset « {name} » ?"):
+            return
+        try:
+            self.preset_store.delete(name)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Préset", str(e))
+            return
+        self.preset_name.set('')
+        self.preset_name_combo['values'] = self.preset_store.names()
     
     def start_conversion(self):
         """Démarrer la conversion"""
@@ -523,100 +1044,279 @@ class FFmpegNVENCGUI:
             messagebox.showwarning("Aucun dossier de sortie", "Veuillez sélectionner un dossier de sortie.")
             return
         
+        # Un préset invalide est refusé avant le lot plutôt qu'à chaque fichier
+        settings = self.checked_settings()
+        if settings is None:
+            return
+        
         self.is_processing = True
+        self.batch_running = True
         self.convert_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
-        self.progress.start()
-        
-        # Démarrer le thread de conversion
-        thread = threading.Thread(target=self.process_files)
+        self.progress['value'] = 0
+        self.batch_start_time = time.time()
+        
+        # Démarrer le thread de conversion sur une copie de la liste
+        files = list(self.input_files)
+        for file_path in files:
+            self.set_file_status(file_path, STATUS_LABELS[EncodeJob.PENDING])
+        priorities = (dict(self.file_priorities), set(self.pinned_files))
+        thread = threading.Thread(target=self.process_files, args=(files, settings, priorities))
         thread.daemon = True
         thread.start()
+        self.root.after(500, self.update_progress)
+    
+    def update_progress(self):
+        """Rafraîchir la progression depuis le thread Tk (toutes les 500 ms)"""
+        scheduler = self.scheduler
+        if not self.is_processing:
+            return
+        if scheduler:
+            fraction = scheduler.batch_progress()
+            finished = sum(1 for job in scheduler.jobs if job.end_time)
+            self.progress['value'] = fraction * 100
+            self.progress_label.config(
+                text=f"{finished}/{len(scheduler.jobs)} - {fraction:.0%} - "
+                     f"reste {format_eta(scheduler.batch_eta(self.batch_start_time))}"
+            )
+            if scheduler.waiting_for_space is not None:
+                self.progress_label.config(
+                    text=self.progress_label.cget('text') + " - en pause: espace disque insuffisant"
+                )
+            self.update_active_jobs(list(scheduler.running))
+            if time.time() - self.eta_updated >= ETA_REFRESH_S:
+                self.update_completion_times(scheduler)
+        self.root.after(500, self.update_progress)
+    
+    def update_completion_times(self, scheduler):
+        """Colonne « Fin estimée »: fin du dernier travail de chaque fichier (lignes modifiées seulement)"""
+        ends = {}
+        for job, end in scheduler.completion_times().items():
+            ends[job.input_file] = max(end, ends.get(job.input_file, end))
+        now = time.time()
+        shown = {}
+        for file_path, end in ends.items():
+            shown[file_path] = time.strftime('%H:%M' if end - now < 86400 else '%d/%m %H:%M', time.localtime(end))
+        for file_path in set(self.eta_shown) | set(shown):
+            text = shown.get(file_path, "")
+            if self.eta_shown.get(file_path, "") != text:
+                self.set_file_column(file_path, 'eta', text)
+        self.eta_shown = shown
+        self.eta_updated = time.time()
+    
+    def update_active_jobs(self, running):
+        """Mettre à jour le tableau des travaux en cours (lignes modifiées seulement)"""
+        now = time.time()
+        for job in running:
+            rss, cpu = sample_process(job.process.pid) if job.process else (None, None)
+            cpu_percent = ""
+            if cpu is not None:
+                previous = self.cpu_samples.get(job)
+                if previous and now > previous[0]:
+                    cpu_percent = f"{100 * (cpu - previous[1]) / (now - previous[0]):.0f}%"
+                self.cpu_samples[job] = (now, cpu)
+            values = (
+                job.name,
+                f"{job.progress:.0%}",
+                format_eta(job.eta),
+                f"{job.fps:.1f}" if job.fps else "",
+                f"{job.speed:.2f}x" if job.speed else "",
+                job.bitrate or "",
+                self.format_file_size(rss * 1024) if rss else "",
+                cpu_percent,
+            )
+            item = self.active_rows.get(job)
+            if item is None:
+                self.active_rows[job] = self.active_tree.insert('', tk.END, values=values)
+            else:
+                self.active_tree.item(item, values=values)
+        
+        for job in [job for job in self.active_rows if job not in running]:
+            self.active_tree.delete(self.active_rows.pop(job))
+            self.cpu_samples.pop(job, None)
+    
+    def clear_active_jobs(self):
+        self.active_tree.delete(*self.active_rows.values())
+        self.active_rows.clear()
+        self.cpu_samples.clear()
     
     def stop_conversion(self):
         """Arrêter la conversion"""
         self.is_processing = False
-        if self.current_process:
-            self.current_process.terminate()
-        self.convert_btn.config(state='normal')
+        if self.scheduler:
+            self.scheduler.stop()
+        # Le bouton de conversion reste désactivé jusqu'à la fin du thread du lot (conversion_finished)
         self.stop_btn.config(state='disabled')
-        self.progress.stop()
+        self.clear_active_jobs()
         self.progress_label.config(text="Conversion arrêtée")
         self.log_message("=== CONVERSION ARRÊTÉE PAR L'UTILISATEUR ===")
     
-    def process_files(self):
+    def process_files(self, files, settings, priorities=({}, set())):
         """Traiter tous les fichiers"""
-        total_files = len(self.input_files)
-        processed_files = 0
+        total_files = len(files)
         
         self.log_message(f"=== DÉBUT DE LA CONVERSION ===")
         self.log_message(f"Fichiers à traiter: {total_files}")
         self.log_message(f"Dossier de sortie: {self.output_folder}")
         self.log_message("")
         
-        for input_file in self.input_files:
-            if not self.is_processing:
-                break
-            
-            output_file = self.get_output_filename(input_file)
-            
-            self.progress_label.config(text=f"Traitement: {os.path.basename(input_file)}")
-            self.log_message(f"Conversion: {os.path.basename(input_file)}")
-            self.log_message(f"Vers: {os.path.basename(output_file)}")
-            
-            cmd = self.build_ffmpeg_command(input_file, output_file)
-            self.log_message(f"Commande: {' '.join(cmd)}")
+        if settings.server:
+            # Les travaux tournent sur le serveur partagé, qui tient aussi le manifeste
+            self.manifest = None
+            self.log_message(f"Serveur de travaux: {settings.server}")
+            self.scheduler = RemoteScheduler(
+                settings.server,
+                on_job_start=self.on_job_start,
+                on_job_output=self.on_job_output,
+                on_job_end=self.on_job_end,
+                on_disk_full=self.on_disk_full,
+                on_job_retry=self.on_job_retry
+            )
+            try:
+                jobs, skipped = self.scheduler.prepare_jobs(settings, files, self.output_folder, priorities)
+            except (OSError, ValueError) as e:
+                self.log_message(f"✗ Serveur de travaux: {e}")
+                jobs, skipped = [], []
+        else:
+            manifest = None
+            if settings.incremental:
+                manifest = JobManifest(os.path.join(self.output_folder, MANIFEST_NAME))
+            self.manifest = manifest
             
             try:
-                self.current_process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1
-                )
-                
-                # Lire la sortie en temps réel
-                for line in self.current_process.stdout:
-                    if not self.is_processing:
-                        break
-                    self.log_message(line.strip())
-                
-                self.current_process.wait()
-                
-                if self.current_process.returncode == 0:
-                    self.log_message(f"✓ Succès: {os.path.basename(input_file)}")
-                else:
-                    self.log_message(f"✗ Échec: {os.path.basename(input_file)} (code: {self.current_process.returncode})")
-                
-            except Exception as e:
-                self.log_message(f"✗ Erreur: {str(e)}")
+                jobs, skipped = prepare_jobs(settings, files, self.output_folder, self.media_cache, manifest,
+                                             self.capabilities)
+            except (OSError, ValueError) as e:
+                # Dossier de sortie inaccessible, commande impossible...: le lot se termine normalement
+                self.log_message(f"✗ Préparation du lot impossible: {e}")
+                jobs, skipped = [], []
+            file_priorities, pinned_files = priorities
+            for job in jobs:
+                job.priority = file_priorities.get(job.input_file, 0)
+                job.pinned = job.input_file in pinned_files
             
+            self.scheduler = EncodeScheduler(
+                max_jobs=settings.max_jobs,
+                max_hw_jobs=settings.max_hw_jobs,
+                max_sw_jobs=settings.max_sw_jobs,
+                on_job_start=self.on_job_start,
+                on_job_output=self.on_job_output,
+                on_job_end=self.on_job_end,
+                on_disk_full=self.on_disk_full,
+                stager=make_stager(settings),
+                on_job_retry=self.on_job_retry
+            )
+        for job in skipped:
+            self.call_in_ui(self.set_file_status, job.input_file, STATUS_LABELS[job.status])
+        
+        if skipped:
+            self.log_message(f"⏭ Fichiers déjà à jour ignorés: {len(skipped)}")
             self.log_message("")
-            processed_files += 1
+        
+        # Les fichiers du dossier surveillé rejoignent ce lot (submit_watched_file)
+        self.batch_settings = settings
+        self.batch_files = list(files)
+        self.batch_skipped = list(skipped)
+        if self.is_processing:
+            # Avec un dossier surveillé, le lot attend les nouveaux fichiers jusqu'à l'arrêt
+            jobs = self.scheduler.run(jobs, persistent=self.watcher is not None)
         
         # Fin de la conversion
+        skipped = self.batch_skipped
+        total_files = len(self.batch_files)
+        for job in jobs:
+            if job.start_time is None:
+                self.call_in_ui(self.set_file_status, job.input_file, STATUS_LABELS[job.status])
+        succeeded = len(skipped) + sum(1 for job in jobs if job.final and job.status == EncodeJob.SUCCESS)
         self.is_processing = False
-        self.current_process = None
+        self.scheduler = None
+        self.batch_settings = None
         
-        self.root.after(0, self.conversion_finished, processed_files, total_files)
+        self.call_in_ui(self.conversion_finished, succeeded, total_files, skipped + jobs, settings)
+    
+    def on_job_start(self, job):
+        """Appelé par l'ordonnanceur au lancement d'un travail"""
+        self.call_in_ui(self.set_file_status, job.input_file, STATUS_LABELS[job.status])
+        self.log_message(f"Conversion: {job.name}")
+        self.log_message(f"Vers: {', '.join(os.path.basename(path) for path in job.output_files)}")
+        if job.pipeline:
+            self.log_message(f"Chaîne: {job.pipeline}")
+        self.log_message(f"Commande: {' '.join(job.cmd)}")
+    
+    def on_job_output(self, job, line):
+        """Appelé pour chaque ligne de sortie de FFmpeg"""
+        self.log_message(f"[{job.name}] {line}")
     
-    def conversion_finished(self, processed, total):
+    def on_job_end(self, job):
+        """Appelé par l'ordonnanceur à la fin d'un travail"""
+        # Un segment terminé ne termine pas le fichier
+        if job.final or job.status != EncodeJob.SUCCESS:
+            self.call_in_ui(self.set_file_status, job.input_file, STATUS_LABELS[job.status])
+        if self.manifest and job.status in (EncodeJob.SUCCESS, EncodeJob.FAILED):
+            self.manifest.record(job)
+        if job.quality:
+            # Métrique du lot, pas celle affichée: ce thread ne lit pas les widgets Tk
+            metric = self.batch_settings.quality_metric if self.batch_settings else ""
+            self.log_message(f"Qualité choisie pour {job.name}: {job.quality[0]} ({metric} {job.quality[1]:.3f})")
+        if job.status == EncodeJob.SUCCESS:
+            self.log_message(f"✓ Succès: {job.name}")
+        elif job.error:
+            self.log_message(f"✗ Erreur: {job.name}: {job.error}")
+        elif job.status == EncodeJob.STOPPED:
+            self.log_message(f"⏹ Arrêté: {job.name}")
+        else:
+            self.log_message(f"✗ Échec: {job.name} (code: {job.returncode})")
+        if job.status == EncodeJob.FAILED and job.failure:
+            self.log_message(f"Cause: {job.failure}, {len(job.attempts)} tentative(s)")
+        self.log_message("")
+    
+    def on_job_retry(self, job):
+        """Appelé quand un travail échoué est remis en file (nouvel essai ou repli logiciel)"""
+        self.call_in_ui(self.set_file_status, job.input_file, STATUS_LABELS[job.status])
+        self.log_message(retry_message(job))
+        self.log_message("")
+    
+    def on_disk_full(self, job):
+        """Appelé quand l'ordonnanceur met le lot en pause faute d'espace disque"""
+        needed = self.format_file_size(job.estimated_size)
+        self.log_message(f"⏸ En pause: espace disque insuffisant pour {job.name} (~{needed} estimés)")
+    
+    def conversion_finished(self, processed, total, jobs=(), settings=None):
         """Appelé quand la conversion est terminée"""
-        self.convert_btn.config(state='normal')
+        self.batch_running = False
+        self.update_convert_button()
         self.stop_btn.config(state='disabled')
-        self.progress.stop()
+        self.progress['value'] = 100 if processed == total else self.progress['value']
+        self.clear_active_jobs()
+        for file_path in self.eta_shown:
+            self.set_file_column(file_path, 'eta', "")
+        self.eta_shown = {}
         self.progress_label.config(text="Conversion terminée")
         
         self.log_message(f"=== CONVERSION TERMINÉE ===")
         self.log_message(f"Fichiers traités: {processed}/{total}")
         
+        if jobs and settings and settings.write_report:
+            try:
+                report = write_run_report(jobs, self.output_folder, self.batch_start_time)
+                self.log_message(f"Rapport: {report}")
+            except OSError as e:
+                self.log_message(f"✗ Rapport non écrit: {e}")
+        
         if processed == total:
             messagebox.showinfo("Conversion terminée", f"Tous les {total} fichiers ont été convertis avec succès!")
         else:
             messagebox.showwarning("Conversion partielle", f"{processed}/{total} fichiers ont été convertis.")
 
 def main():
+    # Mode batch sans interface: fmmp.py batch [options] ENTRÉE... SORTIE
+    if sys.argv[1:2] == ['batch']:
+        sys.exit(run_cli(sys.argv[2:]))
+    # Serveur de travaux partagé: fmmp.py serve [options]
+    if sys.argv[1:2] == ['serve']:
+        sys.exit(run_server(sys.argv[2:]))
+    if tk is None:
+        sys.exit("tkinter n'est pas installé: seuls les modes batch et serve sont disponibles (fmmp.py batch --help)")
     root = tk.Tk()
     app = FFmpegNVENCGUI(root)
     root.mainloop()
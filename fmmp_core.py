@@ -0,0 +1,2896 @@
+#!/usr/bin/env python3
+"""
+Moteur d'encodage FFmpeg sans interface graphique
+Paramètres, construction des commandes, ordonnanceur, caches et mode batch
+(utilisable sans tkinter, par exemple sur une machine de rendu sans écran)
+"""
+
+import argparse
+import csv
+import ctypes
+import hashlib
+import heapq
+import json
+import os
+import re
+import select
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v')
+
+# Manifeste du mode incrémental, écrit dans le dossier de sortie
+MANIFEST_NAME = '.ffmpguipy_manifest.json'
+# Marque des fichiers de sortie temporaires (.nom.fmmp-tmp.ext)
+TEMP_MARK = '.fmmp-tmp'
+# Options exclues de l'empreinte des commandes: elles dépendent de la machine
+# et du nombre d'encodages simultanés, pas du fichier produit
+HASH_IGNORED_OPTIONS = ('-threads', '-filter_threads', '-filter_complex_threads')
+
+# Encodeurs vidéo proposés dans l'interface (filtrés selon FFmpeg)
+VIDEO_ENCODERS = ('h264_nvenc', 'hevc_nvenc', 'av1_nvenc', 'libx264', 'libx265', 'libsvtav1', 'libvpx-vp9')
+
+# Codecs et formats de pixels décodables par NVDEC
+NVDEC_CODECS = ('h264', 'hevc', 'av1', 'vp9', 'vp8', 'mpeg2video', 'mpeg4', 'vc1', 'mjpeg')
+NVDEC_PIX_FMTS = ('yuv420p', 'yuvj420p', 'nv12', 'yuv420p10le', 'p010le', 'yuv444p', 'yuv444p10le')
+
+# Mises à l'échelle reprises telles quelles par scale_cuda/scale_npp (largeur:hauteur)
+GPU_SCALE_RE = re.compile(r'^-?\d+:-?\d+$')
+
+# Codec produit par chaque encodeur (pour la copie de flux)
+ENCODER_CODECS = {
+    'h264_nvenc': 'h264', 'libx264': 'h264',
+    'hevc_nvenc': 'hevc', 'libx265': 'hevc',
+    'av1_nvenc': 'av1', 'libsvtav1': 'av1',
+    'libvpx-vp9': 'vp9',
+}
+
+# Codecs acceptés par conteneur de sortie (absent: tout est accepté)
+CONTAINER_CODECS = {
+    '.mp4': {'h264', 'hevc', 'av1', 'vp9', 'mpeg4', 'aac', 'mp3', 'ac3', 'eac3', 'opus', 'alac', 'flac'},
+    '.m4v': {'h264', 'hevc', 'mpeg4', 'aac', 'mp3', 'ac3', 'eac3', 'alac'},
+    '.mov': {'h264', 'hevc', 'prores', 'mpeg4', 'mjpeg', 'aac', 'mp3', 'ac3', 'alac', 'pcm_s16le', 'pcm_s24le'},
+    '.webm': {'vp8', 'vp9', 'av1', 'opus', 'vorbis'},
+    '.flv': {'h264', 'flv1', 'aac', 'mp3'},
+    '.avi': {'h264', 'mpeg4', 'mjpeg', 'mp3', 'ac3', 'pcm_s16le'},
+    '.wmv': {'wmv1', 'wmv2', 'wmv3', 'vc1', 'wmav1', 'wmav2'},
+}
+
+# Encodeurs logiciels dont les deux passes sont deux exécutions de FFmpeg
+TWO_PASS_ENCODERS = ('libx264', 'libx265', 'libvpx-vp9')
+
+# Marge d'espace disque laissée libre en plus de la taille estimée (octets)
+DISK_SPACE_MARGIN = 64 * 1024 * 1024
+# Intervalle de revérification quand un travail attend de l'espace disque (s)
+DISK_SPACE_RECHECK = 10
+
+# Taille des blocs du préchargement des sources (lectures séquentielles)
+STAGE_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Plage de qualité constante explorée par la recherche de qualité cible
+QUALITY_RANGE = (16, 40)
+QUALITY_RANGES = {'libsvtav1': (20, 55), 'libvpx-vp9': (20, 55)}
+QUALITY_METRICS = ('vmaf', 'ssim')
+# Délai maximal d'un encodage ou d'une mesure d'échantillon de la recherche de qualité (s)
+QUALITY_SAMPLE_TIMEOUT = 600
+VMAF_RE = re.compile(r'VMAF score[:=]\s*([\d.]+)')
+SSIM_RE = re.compile(r'SSIM .*All:([\d.]+)')
+
+# Bornes des paramètres numériques validés avant un lot: clé -> (min, max ou None)
+SETTING_RANGES = {
+    'max_jobs': (1, 64), 'max_hw_jobs': (1, 64), 'max_sw_jobs': (1, 64),
+    'segments': (0, 64), 'segment_min_duration': (0, None),
+    'size_ratio': (0.01, 10), 'stage_ahead': (1, 64), 'stage_max_size': (0.1, None),
+    'quality_samples': (1, 20), 'quality_sample_duration': (1, 60),
+}
+# Valeur maximale du CRF par encodeur (51 sinon)
+CRF_MAX = {'libsvtav1': 63, 'libvpx-vp9': 63}
+FPS_RE = re.compile(r'^(\d+(\.\d+)?(/\d+(\.\d+)?)?|ntsc|pal|film|ntsc-film)$')
+# Échelle "largeur:hauteur" (nombres ou expressions, sans séparateurs de graphe)
+SCALE_RE = re.compile(r'^[^:,;=\[\]\s]+:[^:,;=\[\]\s]+$')
+
+# Vitesse d'encodage de référence (x temps réel en 1080p), pour ordonner et
+# estimer les travaux avant que le débit réel ne soit mesuré
+ENCODER_SPEEDS = {
+    'h264_nvenc': 8.0, 'hevc_nvenc': 6.0, 'av1_nvenc': 5.0,
+    'libx264': 1.5, 'libx265': 0.4, 'libsvtav1': 0.8, 'libvpx-vp9': 0.3,
+    'copy': 50.0, 'aac': 100.0, 'ac3': 100.0, 'mp3': 100.0,
+}
+
+# Encodeur logiciel du même codec, en repli d'un encodeur NVENC indisponible
+SOFTWARE_FALLBACK = {'h264_nvenc': 'libx264', 'hevc_nvenc': 'libx265', 'av1_nvenc': 'libsvtav1'}
+# Préset du repli quand le préset NVENC n'existe pas pour l'encodeur logiciel
+FALLBACK_PRESETS = {'libx264': 'medium', 'libx265': 'medium', 'libsvtav1': '8'}
+
+# Catégories d'échec reconnues dans la sortie de FFmpeg (la première qui correspond)
+FAILURE_PATTERNS = (
+    ('capacity', re.compile(r'OpenEncodeSessionEx failed: (out of memory|incompatible client key)'
+                            r'|CUDA_ERROR_OUT_OF_MEMORY|concurrent sessions|No free encoding sessions', re.I)),
+    ('hardware', re.compile(r'Cannot load (libnvidia-encode|libcuda|nvcuda)|No (NVENC )?capable devices found'
+                            r'|Driver does not support the required nvenc API|CUDA_ERROR_|cuInit\(0\) failed'
+                            r'|hwaccel initialisation returned error|doesn\'t support required NVENC features'
+                            r'|(10 bit encode|pixel format|pix_fmt)\S* not supported|InitializeEncoder failed'
+                            r'|Failed setup for format cuda|Impossible to convert between the formats', re.I)),
+    ('io', re.compile(r'Input/output error|No space left on device|Connection (reset|refused|timed out)'
+                      r'|Stale (NFS )?file handle'
+                      r'|Resource temporarily unavailable|Operation timed out|Network is unreachable|Host is down',
+                      re.I)),
+    ('input', re.compile(r'Invalid data found when processing input|moov atom not found'
+                         r'|could not find codec parameters|Invalid NAL unit|error while decoding|corrupt'
+                         r'|No such file or directory|does not contain any stream|Decoder \(codec .*\) not found',
+                         re.I)),
+)
+# Politique par catégorie: (action, nouvelles tentatives); retry: relancer après
+# une attente croissante, fallback: relancer avec l'encodeur logiciel, fail: abandon.
+# Une capacité toujours saturée après ses tentatives passe aussi au logiciel.
+FAILURE_POLICIES = {
+    'capacity': ('retry', 4),
+    'io': ('retry', 2),
+    'hardware': ('fallback', 1),
+    'input': ('fail', 0),
+    'unknown': ('fail', 0),
+}
+# Attente avant la première nouvelle tentative, doublée à chaque fois (s)
+RETRY_BACKOFF_S = 5
+RETRY_BACKOFF_MAX_S = 120
+# Dernières lignes de FFmpeg gardées pour classer un échec
+FAILURE_TAIL_LINES = 50
+
+# Dossier surveillé: délai pendant lequel taille et date d'un nouveau fichier
+# doivent rester stables avant l'encodage (s)
+WATCH_SETTLE_S = 5
+# Intervalle de vérification des fichiers en cours d'écriture (s)
+WATCH_TICK_S = 1
+# Parcours complet du dossier surveillé: sans inotify / avec inotify (rattrapage) (s)
+WATCH_POLL_S = 5
+WATCH_RESCAN_S = 60
+# Événements inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+
+# Délai maximal des appels de détection de FFmpeg (secondes)
+PROBE_TIMEOUT = 10
+
+# Nombre de processus ffprobe simultanés pour remplir le cache
+PROBE_WORKERS = 4
+
+DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+def parse_timestamp(hours, minutes, seconds):
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_eta(seconds):
+    """Formater une durée restante en h/m/s"""
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressParser:
+    """Analyse incrémentale de la sortie `-progress` de FFmpeg
+    
+    FFmpeg écrit des blocs de lignes `clé=valeur` terminés par
+    `progress=continue` ou `progress=end`. Chaque ligne est passée à feed();
+    les lignes qui ne font pas partie d'un bloc sont renvoyées à l'appelant.
+    """
+    KEYS = ('frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms',
+            'out_time', 'dup_frames', 'drop_frames', 'speed', 'progress')
+    
+    def __init__(self, job):
+        self.job = job
+        self.block = {}
+    
+    def feed(self, line):
+        """Traiter une ligne; renvoie False si ce n'est pas une ligne de progression"""
+        key, sep, value = line.partition('=')
+        key = key.strip()
+        if not sep or key not in self.KEYS:
+            match = DURATION_RE.search(line)
+            if match and self.job.duration is None:
+                self.job.duration = parse_timestamp(*match.groups())
+            return False
+        
+        self.block[key] = value.strip()
+        if key == 'progress':
+            self._apply(self.block)
+            self.block = {}
+        return True
+    
+    def _apply(self, block):
+        job = self.job
+        try:
+            job.frame = int(block.get('frame', job.frame))
+        except ValueError:
+            pass
+        # out_time_ms est en réalité en microsecondes
+        out_time = block.get('out_time_us') or block.get('out_time_ms')
+        if out_time and out_time != 'N/A':
+            job.out_time = max(0.0, int(out_time) / 1000000.0)
+        speed = block.get('speed', '').rstrip('x').strip()
+        if speed and speed != 'N/A':
+            job.speed = float(speed)
+        bitrate = block.get('bitrate', '')
+        if bitrate and bitrate != 'N/A':
+            job.bitrate = bitrate
+        try:
+            job.fps = float(block.get('fps', job.fps or 0))
+        except ValueError:
+            pass
+        if job.duration:
+            job.progress = min(1.0, job.out_time / job.duration)
+        if block.get('progress') == 'end':
+            job.progress = 1.0
+
+
+class EncodeJob:
+    """Un travail d'encodage: un fichier d'entrée, sa commande et son état"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    STOPPED = 'stopped'
+    SKIPPED = 'skipped'
+    
+    def __init__(self, input_file, output_file, cmd, encoder):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.cmd = cmd
+        self.encoder = encoder
+        self.status = self.PENDING
+        self.process = None
+        # Arrêt demandé par stop() ou cancel(): aucun nouveau processus ne doit être lancé
+        self.stop_requested = False
+        self.returncode = None
+        self.error = None
+        self.progress = 0.0
+        self.duration = None
+        self.frame = 0
+        self.out_time = 0.0
+        self.speed = None
+        self.bitrate = None
+        self.fps = None
+        # Mesures de ressources du processus FFmpeg
+        self.input_size = None
+        self.output_size = None
+        self.peak_rss_kb = None
+        self.cpu_time = None
+        self.start_time = None
+        self.end_time = None
+        # Partie d'un fichier découpé (ex: "2/4", "audio", "assemblage")
+        self.part = None
+        # Travaux qui doivent réussir avant celui-ci
+        self.depends_on = []
+        # Appelé après un succès; une exception fait échouer le travail
+        self.verify = None
+        # Appelé à la fin du travail, quel que soit son résultat
+        self.cleanup = None
+        # Empreinte enregistrée dans le manifeste (None: pas d'enregistrement)
+        self.signature = command_hash(cmd)
+        # Faux pour les étapes intermédiaires (segments, audio séparé)
+        self.final = True
+        # Copie de flux ou audio seul: hors de la limite des encodeurs logiciels
+        self.light = False
+        # Chemin choisi pour le travail (affiché dans les logs)
+        self.pipeline = None
+        # Fichier temporaire écrit par FFmpeg, renommé en output_file en cas de succès
+        self.temp_file = None
+        # Taille de sortie estimée, réservée sur le disque avant le lancement
+        self.estimated_size = None
+        # Appelé juste avant le lancement (peut modifier cmd); une exception fait échouer le travail
+        self.prepare = None
+        # Qualité choisie par la recherche de qualité cible: (valeur, note)
+        self.quality = None
+        # Sorties supplémentaires d'un même FFmpeg (paliers): [(temporaire, final)]
+        self.extra_outputs = []
+        # Ordre de la file: épinglés d'abord, puis priorité décroissante, puis coût croissant
+        self.priority = 0
+        self.pinned = False
+        # Coût estimé: secondes d'encodage à la vitesse de référence (ENCODER_SPEEDS)
+        self.cost = None
+        # Appelé après une erreur matérielle: passe la commande à l'encodeur logiciel
+        self.fallback = None
+        # Tentatives: encodeur, début, fin, code de retour, catégorie d'échec, suite donnée
+        self.attempts = []
+        self.failure = None
+        # Pas de nouvelle tentative avant ce timestamp
+        self.not_before = None
+        # Dernières lignes de FFmpeg de la tentative en cours
+        self.output_tail = deque(maxlen=FAILURE_TAIL_LINES)
+    
+    @property
+    def eta(self):
+        """Temps restant estimé en secondes (None si inconnu)"""
+        if self.status != self.RUNNING:
+            return 0 if self.status == self.SUCCESS else None
+        if self.duration and self.speed:
+            return max(0.0, (self.duration - self.out_time) / self.speed)
+        if self.progress > 0 and self.start_time:
+            elapsed = time.time() - self.start_time
+            return elapsed / self.progress - elapsed
+        return None
+    
+    @property
+    def wall_time(self):
+        if self.start_time is None:
+            return None
+        return (self.end_time or time.time()) - self.start_time
+    
+    @property
+    def realtime_speed(self):
+        """Vitesse d'encodage moyenne (x temps réel)"""
+        if self.duration and self.end_time and self.wall_time:
+            return self.duration / self.wall_time
+        return self.speed
+    
+    @property
+    def compression_ratio(self):
+        if self.input_size and self.output_size:
+            return self.output_size / self.input_size
+        return None
+    
+    def report_row(self):
+        """Ligne du rapport de fin de lot"""
+        def rounded(value, digits=3):
+            return round(value, digits) if value is not None else None
+        return {
+            'input': self.input_file,
+            'part': self.part,
+            'output': self.output_file,
+            'status': self.status,
+            'returncode': self.returncode,
+            'pipeline': self.pipeline,
+            'quality': self.quality[0] if self.quality else None,
+            'quality_score': rounded(self.quality[1]) if self.quality else None,
+            'duration_s': rounded(self.duration),
+            'wall_s': rounded(self.wall_time),
+            'speed_x': rounded(self.realtime_speed),
+            'input_bytes': self.input_size,
+            'output_bytes': self.output_size,
+            'compression_ratio': rounded(self.compression_ratio, 4),
+            'peak_rss_kb': self.peak_rss_kb,
+            'cpu_s': rounded(self.cpu_time),
+            'cpu_percent': rounded(100 * self.cpu_time / self.wall_time, 1)
+            if self.cpu_time is not None and self.wall_time else None,
+            'attempts': len(self.attempts),
+            'failure': self.failure,
+        }
+    
+    @property
+    def output_files(self):
+        return [self.output_file] + [output for _, output in self.extra_outputs]
+    
+    @property
+    def is_hardware(self):
+        """Vrai si le travail utilise un encodeur matériel (NVENC)"""
+        return self.encoder.endswith('_nvenc')
+    
+    @property
+    def name(self):
+        name = os.path.basename(self.input_file)
+        return f"{name} [{self.part}]" if self.part else name
+
+
+class InputStager:
+    """Préchargement des fichiers sources vers un dossier de travail local
+    
+    Un thread copie les sources des prochains travaux, dans l'ordre du lot,
+    par gros blocs séquentiels: au plus `ahead` copies prêtes d'avance et
+    `max_bytes` octets dans le dossier de travail. Une copie est supprimée
+    quand tous les travaux qui la lisent sont terminés. Un travail dont la
+    source n'est pas encore en cours de copie lit directement la source.
+    """
+    
+    def __init__(self, scratch_dir, ahead=2, max_bytes=20 * 1024 ** 3):
+        self.scratch_dir = scratch_dir
+        self.ahead = max(1, ahead)
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.stopped = False
+        
+        self._order = []
+        # source -> travaux non terminés, état, copie locale, taille
+        self._users = {}
+        self._states = {}
+        self._local = {}
+        self._sizes = {}
+        # Copies prêtes qu'aucun travail n'a encore commencé à lire
+        self._ready = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._work_dir = None
+    
+    def _reads_source(self, job):
+        return job.input_file in job.cmd
+    
+    def start(self, jobs):
+        """Lancer le préchargement des sources des travaux"""
+        for job in jobs:
+            if not self._reads_source(job):
+                continue
+            if job.input_file not in self._users:
+                self._order.append(job.input_file)
+                self._users[job.input_file] = 0
+                self._states[job.input_file] = 'pending'
+            self._users[job.input_file] += 1
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self._work_dir = tempfile.mkdtemp(prefix='fmmp_stage_', dir=self.scratch_dir)
+        self._thread = threading.Thread(target=self._copy_loop)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def _copy_loop(self):
+        for index, source in enumerate(self._order):
+            try:
+                size = os.path.getsize(source)
+            except OSError:
+                size = None
+            with self._cond:
+                while (not self.stopped and size is not None and size <= self.max_bytes
+                       and self._states[source] == 'pending'
+                       and (len(self._ready) >= self.ahead or self.used_bytes + size > self.max_bytes)):
+                    self._cond.wait()
+                if self.stopped:
+                    return
+                if self._states[source] != 'pending' or size is None or size > self.max_bytes:
+                    # Déjà lu depuis la source, illisible ou trop gros pour le dossier de travail
+                    if self._states[source] == 'pending':
+                        self._states[source] = 'bypass'
+                    continue
+                self._states[source] = 'copying'
+                self._sizes[source] = size
+                self.used_bytes += size
+            
+            local = os.path.join(self._work_dir, f"{index:05d}_{os.path.basename(source)}")
+            try:
+                self._copy(source, local)
+                copied = True
+            except OSError:
+                copied = False
+            with self._cond:
+                self._local[source] = local
+                if copied and not self.stopped and self._users[source] > 0:
+                    self._states[source] = 'ready'
+                    self._ready.add(source)
+                else:
+                    self._evict(source)
+                self._cond.notify_all()
+    
+    def _copy(self, source, local):
+        partial = local + '.part'
+        try:
+            with open(source, 'rb') as src, open(partial, 'wb') as dst:
+                while not self.stopped:
+                    chunk = src.read(STAGE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            if self.stopped:
+                raise OSError("préchargement interrompu")
+            os.replace(partial, local)
+        except OSError:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    
+    def _evict(self, source):
+        local = self._local.pop(source, None)
+        if local and os.path.exists(local):
+            try:
+                os.remove(local)
+            except OSError:
+                pass
+        self.used_bytes -= self._sizes.pop(source, 0)
+        self._ready.discard(source)
+        self._states[source] = 'done'
+    
+    def localize(self, job):
+        """Commande du travail lisant la copie locale (attend une copie en cours)"""
+        source = job.input_file
+        if not self._reads_source(job) or source not in self._states:
+            return job.cmd
+        with self._cond:
+            if self._states[source] == 'pending':
+                self._states[source] = 'bypass'
+            while self._states[source] == 'copying' and not self.stopped:
+                self._cond.wait()
+            local = self._local.get(source) if self._states[source] == 'ready' else None
+            self._ready.discard(source)
+            self._cond.notify_all()
+        if local is None:
+            return job.cmd
+        return [local if arg == source else arg for arg in job.cmd]
+    
+    def release(self, job):
+        """Un travail est terminé: supprimer la copie si plus aucun travail ne la lit"""
+        source = job.input_file
+        if not self._reads_source(job) or source not in self._users:
+            return
+        with self._cond:
+            self._users[source] -= 1
+            if self._users[source] <= 0 and self._states[source] in ('pending', 'ready'):
+                self._evict(source)
+            self._cond.notify_all()
+    
+    def stop(self):
+        """Interrompre la copie en cours et réveiller les travaux en attente"""
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+    
+    def close(self):
+        """Arrêter le préchargement et vider le dossier de travail"""
+        self.stop()
+        if self._thread:
+            self._thread.join()
+        if self._work_dir:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+        self.used_bytes = 0
+
+
+def make_stager(settings):
+    """Préchargement configuré par les paramètres (None si désactivé)"""
+    if not settings.stage_dir:
+        return None
+    return InputStager(settings.stage_dir, int(settings.stage_ahead),
+                       int(float(settings.stage_max_size) * 1024 ** 3))
+
+
+class EncodeScheduler:
+    """Ordonnanceur: garde jusqu'à N processus FFmpeg actifs en parallèle
+    
+    Les limites matérielles (encodeurs *_nvenc) et logicielles sont
+    indépendantes, en plus de la limite globale. Un emplacement libéré est
+    réattribué immédiatement au prochain travail compatible.
+    
+    La file est une file de priorité: travaux épinglés, puis priorité de
+    l'utilisateur, puis le plus court d'abord (coût estimé). Priorités et
+    épinglage peuvent changer pendant le lot.
+    
+    En mode permanent (serveur de travaux), run() attend de nouveaux travaux
+    ajoutés par submit() jusqu'à stop().
+    
+    Un travail échoué est classé d'après la sortie de FFmpeg et, selon
+    FAILURE_POLICIES, remis en file après une attente, passé à l'encodeur
+    logiciel ou abandonné; chaque tentative est enregistrée dans job.attempts.
+    """
+    
+    def __init__(self, max_jobs=2, max_hw_jobs=2, max_sw_jobs=1,
+                 on_job_start=None, on_job_output=None, on_job_end=None, on_disk_full=None,
+                 stager=None, on_job_retry=None):
+        self.max_jobs = max(1, max_jobs)
+        self.max_hw_jobs = max(1, max_hw_jobs)
+        self.max_sw_jobs = max(1, max_sw_jobs)
+        self.on_job_start = on_job_start
+        self.on_job_output = on_job_output
+        self.on_job_end = on_job_end
+        self.on_disk_full = on_disk_full
+        self.on_job_retry = on_job_retry
+        # Préchargement optionnel des sources (InputStager)
+        self.stager = stager
+        
+        self.jobs = []
+        self.pending = []
+        self.running = []
+        self.stopped = False
+        # Mode permanent: run() attend de nouveaux travaux quand la file est vide
+        self.persistent = False
+        # Travaux annulés individuellement par cancel()
+        self._cancelled = set()
+        self._reorder = True
+        # Débit mesuré par type d'encodeur: [coût terminé, secondes réelles]
+        self._throughput = {True: [0.0, 0.0], False: [0.0, 0.0]}
+        # Travail en attente d'espace disque (None si aucun)
+        self.waiting_for_space = None
+        self._cond = threading.Condition()
+        self._devices = {}
+    
+    def _device(self, directory):
+        if directory not in self._devices:
+            try:
+                self._devices[directory] = os.stat(directory).st_dev
+            except OSError:
+                self._devices[directory] = None
+        return self._devices[directory]
+    
+    def _has_space(self, job, free_cache):
+        """Vrai si le disque de sortie peut recevoir la sortie estimée du travail
+        
+        L'espace réservé par les travaux en cours sur le même disque est déduit.
+        """
+        if not job.estimated_size:
+            return True
+        directory = os.path.dirname(job.output_file) or '.'
+        device = self._device(directory)
+        if device not in free_cache:
+            try:
+                free_cache[device] = shutil.disk_usage(directory).free
+            except OSError:
+                free_cache[device] = None
+        free = free_cache[device]
+        if free is None:
+            return True
+        reserved = sum(j.estimated_size or 0 for j in self.running
+                       if self._device(os.path.dirname(j.output_file) or '.') == device)
+        return free - reserved >= job.estimated_size + DISK_SPACE_MARGIN
+    
+    def _has_slot(self, job):
+        if len(self.running) >= self.max_jobs:
+            return False
+        if job.light:
+            # Assemblage ou audio: quelques secondes de CPU, ne bloque pas derrière les encodages
+            return True
+        same_kind = [j for j in self.running if j.is_hardware == job.is_hardware and not j.light]
+        if not job.is_hardware:
+            return len(same_kind) < self.max_sw_jobs
+        # Un travail à paliers ouvre une session NVENC par sortie
+        sessions = sum(len(j.output_files) for j in same_kind)
+        return not same_kind or sessions + len(job.output_files) <= self.max_hw_jobs
+    
+    @staticmethod
+    def _order_key(job):
+        return (not job.pinned, -job.priority, job.cost or 0.0)
+    
+    def set_priority(self, input_file, priority=None, pinned=None, jobs=None):
+        """Changer la priorité ou l'épinglage des travaux d'un fichier (même pendant le lot)
+        
+        `jobs` limite la recherche à ces travaux (un lot parmi d'autres).
+        """
+        with self._cond:
+            for job in self.jobs if jobs is None else jobs:
+                if job.input_file == input_file:
+                    if priority is not None:
+                        job.priority = priority
+                    if pinned is not None:
+                        job.pinned = pinned
+            self._reorder = True
+            self._cond.notify_all()
+    
+    def _next_job(self, pending):
+        """Premier travail en attente prêt et pour lequel un emplacement est libre
+        
+        Un travail sans assez d'espace disque est différé: les suivants,
+        peut-être plus petits ou sur un autre disque, peuvent passer avant.
+        """
+        if self._reorder:
+            # Tri stable: à égalité, l'ordre d'ajout est conservé
+            pending.sort(key=self._order_key)
+            self._reorder = False
+        free_cache = {}
+        now = time.time()
+        self.waiting_for_space = None
+        for job in list(pending):
+            if job.not_before and job.not_before > now:
+                # Nouvelle tentative pas encore due
+                continue
+            statuses = {dep.status for dep in job.depends_on}
+            if statuses - {EncodeJob.SUCCESS, EncodeJob.PENDING, EncodeJob.RUNNING}:
+                # Une dépendance a échoué: le travail ne peut pas être lancé
+                pending.remove(job)
+                job.status = EncodeJob.FAILED
+                job.error = "un travail préalable a échoué"
+                self._finish(job)
+            elif not statuses - {EncodeJob.SUCCESS} and self._has_slot(job):
+                if not self._has_space(job, free_cache):
+                    if self.waiting_for_space is None:
+                        self.waiting_for_space = job
+                    continue
+                pending.remove(job)
+                return job
+        return None
+    
+    def _finish(self, job):
+        if job.cleanup:
+            try:
+                job.cleanup(job)
+            except Exception as e:
+                job.error = job.error or str(e)
+        if self.stager:
+            self.stager.release(job)
+        if self.on_job_end:
+            self.on_job_end(job)
+    
+    def _retry_delay(self):
+        """Secondes avant la prochaine nouvelle tentative en attente (None s'il n'y en a pas)"""
+        # Une tentative déjà due attend un emplacement libre: rien à minuter
+        now = time.time()
+        due = [job.not_before for job in self.pending if job.not_before and job.not_before > now]
+        return min(due) - now if due else None
+    
+    def _retry(self, job):
+        """Appliquer la politique de la catégorie d'échec; vrai si le travail doit être remis en file"""
+        action, limit = FAILURE_POLICIES.get(job.failure, ('fail', 0))
+        tries = sum(1 for attempt in job.attempts if attempt['failure'] == job.failure)
+        if action == 'retry' and tries > limit:
+            action = 'fallback' if job.failure == 'capacity' else 'fail'
+        if action == 'fallback' and (not job.fallback or not job.is_hardware):
+            action = 'fail'
+        job.attempts[-1]['action'] = action
+        if action == 'fail':
+            return False
+        
+        delay = 0.0
+        if action == 'fallback':
+            job.fallback(job)
+            job.fallback = None
+        else:
+            delay = min(RETRY_BACKOFF_MAX_S, RETRY_BACKOFF_S * 2 ** (tries - 1))
+        job.status = EncodeJob.PENDING
+        job.not_before = time.time() + delay
+        job.returncode = job.error = job.process = None
+        job.start_time = job.end_time = None
+        job.progress = job.out_time = 0.0
+        job.frame = 0
+        job.speed = job.fps = job.bitrate = None
+        if self.on_job_retry:
+            self.on_job_retry(job)
+        return True
+    
+    def submit(self, jobs):
+        """Ajouter des travaux à la file, même pendant run()"""
+        with self._cond:
+            self.jobs.extend(jobs)
+            self.pending.extend(jobs)
+            self._reorder = True
+            self._cond.notify_all()
+    
+    def cancel(self, jobs):
+        """Annuler des travaux: retirés de la file s'ils attendent, arrêtés s'ils tournent"""
+        removed = []
+        with self._cond:
+            for job in jobs:
+                if job in self.pending:
+                    self.pending.remove(job)
+                    job.status = EncodeJob.STOPPED
+                    removed.append(job)
+                elif job in self.running:
+                    self._cancelled.add(job)
+                    job.stop_requested = True
+                    if job.process and job.process.poll() is None:
+                        job.process.terminate()
+            self._cond.notify_all()
+        for job in removed:
+            self._finish(job)
+    
+    def drain(self):
+        """Quitter le mode permanent: run() se termine quand la file est vide"""
+        with self._cond:
+            self.persistent = False
+            self._cond.notify_all()
+    
+    def forget(self, jobs):
+        """Oublier des travaux terminés (serveur permanent: la liste ne grandit pas sans fin)"""
+        forgotten = set(jobs)
+        with self._cond:
+            self.jobs = [job for job in self.jobs if job not in forgotten]
+            self._cancelled -= forgotten
+    
+    def run(self, jobs, persistent=False):
+        """Exécuter tous les travaux (bloquant) et renvoyer la liste des travaux
+        
+        Avec `persistent`, attendre les travaux ajoutés par submit() jusqu'à stop().
+        """
+        with self._cond:
+            self.jobs.extend(jobs)
+            self.pending.extend(jobs)
+            self.pending.sort(key=self._order_key)
+            self._reorder = False
+            self.persistent = persistent
+        pending = self.pending
+        notified = None
+        if self.stager:
+            self.stager.start(pending)
+        
+        with self._cond:
+            while not self.stopped and (pending or self.running or self.persistent):
+                job = self._next_job(pending)
+                if job is None:
+                    if self.waiting_for_space is not None:
+                        # Pause jusqu'à ce qu'un travail se termine ou que de l'espace se libère
+                        if self.on_disk_full and self.waiting_for_space is not notified:
+                            notified = self.waiting_for_space
+                            self.on_disk_full(notified)
+                        self._cond.wait(DISK_SPACE_RECHECK)
+                    else:
+                        self._cond.wait(self._retry_delay())
+                    continue
+                job.status = EncodeJob.RUNNING
+                job.start_time = time.time()
+                job.not_before = None
+                job.stop_requested = False
+                self.running.append(job)
+                thread = threading.Thread(target=self._run_job, args=(job,))
+                thread.daemon = True
+                thread.start()
+            
+            # Attendre la fin des processus déjà terminés par stop()
+            while self.running:
+                self._cond.wait()
+        
+        if self.stager:
+            self.stager.close()
+        for job in pending:
+            job.status = EncodeJob.STOPPED
+            if job.cleanup:
+                job.cleanup(job)
+        return self.jobs
+    
+    def batch_progress(self):
+        """Progression globale (0-1), pondérée par la durée des fichiers"""
+        if not self.jobs:
+            return 0.0
+        known = [job.duration for job in self.jobs if job.duration]
+        default = sum(known) / len(known) if known else 1.0
+        total = done = 0.0
+        for job in self.jobs:
+            weight = job.duration or default
+            total += weight
+            done += weight * job.progress
+        return done / total if total else 0.0
+    
+    def throughput(self, hardware):
+        """Débit mesuré (coût de référence traité par seconde réelle), 1.0 avant toute mesure"""
+        cost, seconds = self._throughput[hardware]
+        return cost / seconds if cost and seconds else 1.0
+    
+    def completion_times(self):
+        """Heure de fin estimée (timestamp) de chaque travail non terminé
+        
+        Simulation de la file: les travaux en cours finissent selon leur ETA,
+        puis chaque travail en attente, dans l'ordre de la file, prend le
+        premier emplacement libre pendant coût / débit mesuré.
+        """
+        now = time.time()
+        with self._cond:
+            running = list(self.running)
+            pending = sorted(self.pending, key=self._order_key) if self._reorder else list(self.pending)
+        
+        times = {}
+        slots = []
+        for job in running:
+            eta = job.eta
+            if eta is None:
+                eta = (job.cost or 0.0) * (1 - job.progress) / self.throughput(job.is_hardware)
+            times[job] = now + eta
+            slots.append(times[job])
+        slots.extend([now] * max(0, self.max_jobs - len(slots)))
+        heapq.heapify(slots)
+        for job in pending:
+            start = max(heapq.heappop(slots), job.not_before or 0.0)
+            times[job] = start + (job.cost or 0.0) / self.throughput(job.is_hardware)
+            heapq.heappush(slots, times[job])
+        return times
+    
+    def batch_eta(self, start_time):
+        """Temps restant estimé pour tout le lot"""
+        fraction = self.batch_progress()
+        if fraction <= 0:
+            return None
+        elapsed = time.time() - start_time
+        return elapsed / fraction - elapsed
+    
+    def _run_job(self, job):
+        retry = False
+        try:
+            retry = self._attempt(job)
+        finally:
+            # Même si un rappel échoue, l'emplacement est libéré (sinon le lot ne se termine jamais)
+            with self._cond:
+                self.running.remove(job)
+                if retry:
+                    self.pending.append(job)
+                    self._reorder = True
+                self._cond.notify_all()
+    
+    def _attempt(self, job):
+        """Une tentative du travail; vrai s'il doit être remis en file"""
+        job.output_tail.clear()
+        if self.on_job_start:
+            self.on_job_start(job)
+        try:
+            if job.prepare:
+                job.prepare(job)
+            cmd = self.stager.localize(job) if self.stager else job.cmd
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+                bufsize=1
+            )
+            with self._cond:
+                job.process = process
+                if self.stopped or job in self._cancelled:
+                    process.terminate()
+            
+            # Lire la progression en temps réel, les autres lignes vont aux logs
+            parser = ProgressParser(job)
+            for line in process.stdout:
+                if not parser.feed(line):
+                    job.output_tail.append(line.rstrip())
+                    if self.on_job_output:
+                        self.on_job_output(job, line.rstrip())
+            
+            job.returncode = wait_process(process, job)
+        except Exception as e:
+            job.error = str(e)
+        
+        if job.returncode == 0 and job.verify:
+            try:
+                job.verify(job)
+            except Exception as e:
+                job.error = str(e)
+        
+        # Sorties temporaires: renommage atomique en cas de succès, suppression sinon
+        outputs = [(job.temp_file, job.output_file)] if job.temp_file else []
+        for temp_file, output_file in outputs + job.extra_outputs:
+            try:
+                if job.returncode == 0 and not job.error:
+                    os.replace(temp_file, output_file)
+                elif os.path.exists(temp_file):
+                    os.remove(temp_file)
+            except OSError as e:
+                job.error = job.error or str(e)
+        measure_files(job)
+        
+        job.end_time = time.time()
+        if (self.stopped or job in self._cancelled) and job.returncode != 0:
+            job.status = EncodeJob.STOPPED
+        elif job.returncode == 0 and not job.error:
+            job.status = EncodeJob.SUCCESS
+            job.progress = 1.0
+            if job.cost:
+                with self._cond:
+                    measured = self._throughput[job.is_hardware]
+                    measured[0] += job.cost
+                    measured[1] += job.wall_time
+        else:
+            job.status = EncodeJob.FAILED
+        
+        attempt = {'encoder': job.encoder, 'start': job.start_time, 'end': job.end_time,
+                   'returncode': job.returncode, 'status': job.status, 'failure': None, 'message': None,
+                   'action': None}
+        job.attempts.append(attempt)
+        if job.status == EncodeJob.FAILED:
+            job.failure, attempt['message'] = classify_failure(list(job.output_tail) + [job.error or ''])
+            attempt['failure'] = job.failure
+            attempt['message'] = attempt['message'] or job.error
+            if not self.stopped and job not in self._cancelled and self._retry(job):
+                return True
+        self._finish(job)
+        return False
+    
+    def stop(self):
+        """Arrêter l'ordonnanceur et terminer tous les processus en cours"""
+        with self._cond:
+            self.stopped = True
+            for job in self.running:
+                job.stop_requested = True
+                if job.process and job.process.poll() is None:
+                    job.process.terminate()
+            self._cond.notify_all()
+        if self.stager:
+            self.stager.stop()
+
+
+def sample_process(pid):
+    """(RSS en Ko, temps CPU en s) d'un processus vivant, via /proc (Linux)"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            rss = next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), None)
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        return rss, cpu
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None, None
+
+
+def wait_process(process, job):
+    """Attendre la fin du processus en relevant ses ressources (wait4 sous POSIX)"""
+    if not hasattr(os, 'wait4'):
+        return process.wait()
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return process.wait()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    job.peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    job.cpu_time = usage.ru_utime + usage.ru_stime
+    return process.returncode
+
+
+def retry_message(job):
+    """Ligne de journal décrivant la nouvelle tentative d'un travail échoué"""
+    attempt = job.attempts[-1]
+    action = f"repli {job.encoder}" if attempt['action'] == 'fallback' else "nouvel essai"
+    delay = max(0.0, (job.not_before or 0) - time.time())
+    reason = attempt['message'] or f"code {attempt['returncode']}"
+    return (f"↻ {job.name}: échec {attempt['failure']} ({reason}) → {action}"
+            + (f" dans {delay:.0f}s" if delay >= 1 else ""))
+
+
+def classify_failure(lines):
+    """(catégorie, ligne en cause) d'un échec d'après la sortie de FFmpeg (FAILURE_PATTERNS)"""
+    for category, pattern in FAILURE_PATTERNS:
+        for line in reversed(lines):
+            if pattern.search(line):
+                return category, line.strip()
+    return 'unknown', None
+
+
+def measure_files(job):
+    """Tailles d'entrée et de sortie d'un travail terminé"""
+    try:
+        job.input_size = os.path.getsize(job.input_file)
+    except OSError:
+        pass
+    try:
+        if job.output_file != '-':
+            job.output_size = sum(os.path.getsize(path) for path in job.output_files)
+    except OSError:
+        pass
+
+
+REPORT_FIELDS = ('input', 'part', 'output', 'status', 'returncode', 'pipeline', 'quality', 'quality_score',
+                 'duration_s', 'wall_s',
+                 'speed_x', 'input_bytes', 'output_bytes', 'compression_ratio', 'peak_rss_kb', 'cpu_s',
+                 'cpu_percent', 'attempts', 'failure')
+
+
+def write_run_report(jobs, folder, start_time=None):
+    """Écrire le rapport du lot (JSON et CSV) et renvoyer le chemin du JSON"""
+    rows = [job.report_row() for job in jobs]
+    # Le JSON détaille aussi chaque tentative
+    detailed = [dict(row, attempt_log=job.attempts) for row, job in zip(rows, jobs)]
+    finished = [job for job in jobs if job.status == EncodeJob.SUCCESS and job.final]
+    total_in = sum(job.input_size or 0 for job in finished)
+    total_out = sum(job.output_size or 0 for job in finished)
+    media = sum(job.duration or 0 for job in finished)
+    wall = time.time() - start_time if start_time else None
+    summary = {
+        'jobs': len(jobs),
+        'succeeded': sum(1 for job in jobs if job.status in (EncodeJob.SUCCESS, EncodeJob.SKIPPED)),
+        'failed': sum(1 for job in jobs if job.status == EncodeJob.FAILED),
+        'wall_s': round(wall, 3) if wall else None,
+        'media_s': round(media, 3),
+        'speed_x': round(media / wall, 3) if wall else None,
+        'files_per_min': round(len(finished) / wall * 60, 2) if wall else None,
+        'input_bytes': total_in,
+        'output_bytes': total_out,
+        'compression_ratio': round(total_out / total_in, 4) if total_in else None,
+        'cpu_s': round(sum(job.cpu_time or 0 for job in jobs), 3),
+        'peak_rss_kb': max((job.peak_rss_kb or 0 for job in jobs), default=0),
+    }
+    base = os.path.join(folder, time.strftime('fmmp_report_%Y%m%d_%H%M%S'))
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'jobs': detailed}, f, indent=2)
+    with open(base + '.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return base + '.json'
+
+
+def command_hash(cmd):
+    """Empreinte d'une commande FFmpeg (détecte un changement de paramètres)
+    
+    L'exécutable, les options de HASH_IGNORED_OPTIONS et les chemins
+    d'entrée et de sortie temporaire sont exclus: changer --jobs, de
+    machine ou de FFmpeg ne rend pas les sorties périmées.
+    """
+    normalized = []
+    args = iter(cmd[1:])
+    for arg in args:
+        if arg in HASH_IGNORED_OPTIONS:
+            next(args, None)
+        elif arg == '-i':
+            next(args, None)
+            normalized.extend(['-i', '<entrée>'])
+        elif TEMP_MARK in os.path.basename(arg):
+            normalized.append('<sortie>')
+        else:
+            normalized.append(arg)
+    return hashlib.sha1(json.dumps(normalized).encode('utf-8')).hexdigest()
+
+
+class JobManifest:
+    """Manifeste des travaux terminés pour le mode incrémental
+    
+    Chaque entrée (clé: fichier de sortie) enregistre la taille et la date
+    de l'entrée, l'empreinte de la commande, la taille de la sortie, le
+    code de retour et l'état final. Un travail est à jour s'il a réussi
+    (vérification et renommage compris) et si tout cela correspond encore.
+    Le manifeste est réécrit après chaque travail pour pouvoir reprendre
+    un lot interrompu.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+    
+    def is_current(self, job):
+        """Vrai si la sortie de `job` est déjà à jour"""
+        with self._lock:
+            entry = self._entries.get(job.output_file)
+        # Un code de retour nul ne suffit pas: la vérification ou le renommage ont pu échouer
+        if not entry or entry.get('status') != EncodeJob.SUCCESS:
+            return False
+        try:
+            input_stat = os.stat(job.input_file)
+            output_size = os.path.getsize(job.output_file)
+        except OSError:
+            return False
+        return (entry['input'] == job.input_file
+                and entry['input_size'] == input_stat.st_size
+                and entry['input_mtime'] == input_stat.st_mtime
+                and entry['cmd_hash'] == job.signature
+                and entry['output_size'] == output_size)
+    
+    def record(self, job):
+        """Enregistrer le résultat d'un travail terminé et sauvegarder"""
+        if job.signature is None:
+            return
+        try:
+            input_stat = os.stat(job.input_file)
+            output_size = os.path.getsize(job.output_file)
+        except OSError:
+            input_stat = None
+            output_size = None
+        entry = {
+            'input': job.input_file,
+            'input_size': input_stat.st_size if input_stat else None,
+            'input_mtime': input_stat.st_mtime if input_stat else None,
+            'cmd_hash': job.signature,
+            'output_size': output_size,
+            'returncode': job.returncode,
+            'status': job.status,
+            'finished': job.end_time,
+        }
+        with self._lock:
+            self._entries[job.output_file] = entry
+            data = json.dumps(self._entries, indent=1)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+
+def scan_videos(folder, cancel_event=None):
+    """Parcourir `folder` récursivement avec os.scandir
+    
+    Génère des tuples (chemin, stat) pour chaque vidéo trouvée. Le stat
+    provient de DirEntry, ce qui évite un appel système supplémentaire
+    sous Windows.
+    """
+    stack = [folder]
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                            yield entry.path, entry.stat()
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        stack.extend(reversed(sorted(subdirs)))
+
+
+class Inotify:
+    """Notifications du noyau Linux (inotify, via ctypes) pour des dossiers"""
+    MASK = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO
+    
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dirs = {}
+    
+    def add(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self._dirs[wd] = directory
+    
+    def read(self, timeout):
+        """[(chemin, dossier?)] créés ou écrits; None si le noyau a perdu des événements"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        paths = []
+        overflow = False
+        offset = 0
+        while offset + 16 <= len(data):
+            wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+            offset += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+            elif wd in self._dirs and name:
+                paths.append((os.path.join(self._dirs[wd], os.fsdecode(name)), bool(mask & IN_ISDIR)))
+        return None if overflow else paths
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Surveillance d'un dossier: chaque nouvelle vidéo est signalée une fois stable
+    
+    inotify (Linux) signale les fichiers créés ou écrits, avec un parcours
+    complet de rattrapage toutes les WATCH_RESCAN_S secondes; sans inotify,
+    le dossier est parcouru toutes les WATCH_POLL_S secondes. Un fichier est
+    signalé (on_file(chemin, stat), depuis le thread de surveillance) quand
+    sa taille et sa date n'ont pas changé depuis `settle` secondes. Les
+    fichiers connus (`known`), refusés par `accept` ou dont un élément du
+    chemin est caché (temporaires et segments de fmmp) sont ignorés.
+    """
+    
+    def __init__(self, folder, on_file, known=(), accept=None, settle=WATCH_SETTLE_S):
+        self.folder = os.path.abspath(folder)
+        self.on_file = on_file
+        self.accept = accept
+        self.settle = settle
+        self.known = {os.path.abspath(path) for path in known}
+        # Chemin -> ((taille, date), stable depuis)
+        self._candidates = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+    
+    @property
+    def backend(self):
+        return 'inotify' if self._inotify else 'polling'
+    
+    def start(self):
+        if sys.platform.startswith('linux'):
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError):
+                self._inotify = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _hidden(self, path):
+        try:
+            parts = Path(path).relative_to(self.folder).parts
+        except ValueError:
+            return True
+        return any(part.startswith('.') for part in parts)
+    
+    def _scan(self, folder):
+        """Surveiller `folder` et ses sous-dossiers, et relever leurs vidéos"""
+        if self._hidden(folder):
+            return
+        for directory, subdirs, names in os.walk(folder):
+            subdirs[:] = [name for name in subdirs if not name.startswith('.')]
+            if self._inotify:
+                self._inotify.add(directory)
+            for name in names:
+                self._candidate(os.path.join(directory, name))
+    
+    def _candidate(self, path):
+        if (path in self.known or path in self._candidates or self._hidden(path)
+                or not path.lower().endswith(VIDEO_EXTENSIONS)):
+            return
+        if self.accept and not self.accept(path):
+            self.known.add(path)
+            return
+        self._candidates[path] = (None, 0.0)
+    
+    def _check(self):
+        """Signaler les fichiers dont la taille et la date sont stables depuis `settle` secondes"""
+        now = time.time()
+        for path, (signature, since) in list(self._candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._candidates[path]
+                continue
+            current = (stat.st_size, stat.st_mtime)
+            if current != signature:
+                self._candidates[path] = (current, now)
+            elif now - since >= self.settle and stat.st_size > 0:
+                del self._candidates[path]
+                self.known.add(path)
+                self.on_file(path, stat)
+    
+    def _run(self):
+        self._scan(self.folder)
+        last_scan = time.time()
+        while not self._stop.is_set():
+            if self._inotify:
+                try:
+                    events = self._inotify.read(WATCH_TICK_S)
+                except OSError:
+                    events = None
+                if events is None:
+                    # File d'événements débordée: reparcourir tout le dossier
+                    last_scan = 0.0
+                for path, is_dir in events or ():
+                    if is_dir:
+                        self._scan(path)
+                    else:
+                        self._candidate(path)
+            else:
+                self._stop.wait(WATCH_TICK_S)
+            if time.time() - last_scan >= (WATCH_RESCAN_S if self._inotify else WATCH_POLL_S):
+                self._scan(self.folder)
+                last_scan = time.time()
+            self._check()
+        if self._inotify:
+            self._inotify.close()
+
+
+def make_watcher(settings, folder, output_folder, on_file, known=()):
+    """Surveillance de `folder` qui ne reprend pas les sorties du lot
+    
+    Un dossier de sortie situé sous `folder` est ignoré en entier. S'il
+    contient `folder` (ou lui est égal), seuls les fichiers sans le suffixe
+    de sortie, paliers compris (`_720p`), sont de nouvelles sources (aucun
+    si le suffixe est vide).
+    """
+    folder = os.path.join(os.path.abspath(folder), '')
+    output_folder = os.path.join(os.path.abspath(output_folder), '')
+    inside = output_folder != folder and output_folder.startswith(folder)
+    produced = re.compile(re.escape(settings.output_suffix) + r'(_\d+p)?$')
+    
+    def accept(path):
+        if not path.startswith(output_folder):
+            return True
+        if inside:
+            return False
+        return bool(settings.output_suffix) and not produced.search(Path(path).stem)
+    
+    return FolderWatcher(folder, on_file, known, accept)
+
+
+def get_config_dir():
+    """Dossier de configuration utilisateur (créé si nécessaire)"""
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    path = os.path.join(base, 'ffmpguipy')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _run_ffmpeg_info(ffmpeg_path, *args):
+    result = subprocess.run([ffmpeg_path, '-hide_banner', *args],
+                            capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    return result.stdout
+
+
+def parse_encoders(output):
+    """Noms des encodeurs de `ffmpeg -encoders`"""
+    names = []
+    started = False
+    for line in output.splitlines():
+        if line.strip().startswith('------'):
+            started = True
+        elif started and line.strip():
+            parts = line.split()
+            if len(parts) >= 2:
+                names.append(parts[1])
+    return names
+
+
+def parse_filters(output):
+    """Noms des filtres de `ffmpeg -filters`"""
+    names = []
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and '->' in parts[2]:
+            names.append(parts[1])
+    return names
+
+
+def parse_hwaccels(output):
+    """Méthodes de `ffmpeg -hwaccels`"""
+    lines = [line.strip() for line in output.splitlines()]
+    if 'Hardware acceleration methods:' in lines:
+        lines = lines[lines.index('Hardware acceleration methods:') + 1:]
+    return [line for line in lines if line]
+
+
+def parse_preset_values(output):
+    """Valeurs nommées de l'option -preset dans `ffmpeg -h encoder=...`"""
+    values = []
+    option_indent = None
+    for line in output.splitlines():
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        if option_indent is None:
+            if stripped.startswith('-preset '):
+                option_indent = indent
+        elif indent > option_indent and stripped and not stripped.startswith('-'):
+            values.append(stripped.split()[0])
+        else:
+            break
+    return values
+
+
+def detect_capabilities(ffmpeg_path):
+    """Interroger FFmpeg: version, encodeurs, hwaccels, filtres et présets"""
+    version = _run_ffmpeg_info(ffmpeg_path, '-version')
+    if 'ffmpeg version' not in version:
+        return {'available': False}
+    encoders = parse_encoders(_run_ffmpeg_info(ffmpeg_path, '-encoders'))
+    presets = {}
+    for encoder in VIDEO_ENCODERS:
+        if encoder in encoders:
+            presets[encoder] = parse_preset_values(_run_ffmpeg_info(ffmpeg_path, '-h', f'encoder={encoder}'))
+    return {
+        'available': True,
+        'version': version.splitlines()[0],
+        'encoders': encoders,
+        'hwaccels': parse_hwaccels(_run_ffmpeg_info(ffmpeg_path, '-hwaccels')),
+        'filters': parse_filters(_run_ffmpeg_info(ffmpeg_path, '-filters')),
+        'presets': presets,
+    }
+
+
+def load_capabilities(ffmpeg_path, cache_path=None):
+    """Capacités de FFmpeg, mises en cache par chemin + date de l'exécutable"""
+    resolved = shutil.which(ffmpeg_path)
+    if resolved is None:
+        return {'available': False}
+    resolved = os.path.realpath(resolved)
+    key = f"{resolved}|{os.stat(resolved).st_mtime}"
+    cache_path = cache_path or os.path.join(get_config_dir(), 'capabilities.json')
+    
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache:
+        return cache[key]
+    
+    try:
+        caps = detect_capabilities(resolved)
+    except (OSError, subprocess.SubprocessError):
+        return {'available': False}
+    if caps['available']:
+        # Ne garder que les entrées des exécutables encore présents
+        cache = {k: v for k, v in cache.items() if os.path.exists(k.rsplit('|', 1)[0])}
+        cache[key] = caps
+        tmp = cache_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp, cache_path)
+    return caps
+
+
+def get_ffprobe_path(ffmpeg_path):
+    """Chemin de ffprobe à côté de l'exécutable FFmpeg configuré"""
+    directory, name = os.path.split(ffmpeg_path)
+    return os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+
+
+def parse_fps(rate):
+    """Convertir un débit d'images FFprobe ('30000/1001') en float"""
+    try:
+        num, _, den = rate.partition('/')
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def probe_media(ffprobe, path):
+    """Lire les métadonnées d'un fichier avec ffprobe"""
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe code {result.returncode}")
+    data = json.loads(result.stdout)
+    fmt = data.get('format', {})
+    streams = data.get('streams', [])
+    video = next((st for st in streams if st.get('codec_type') == 'video'), {})
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), {})
+    
+    counts = {}
+    for st in streams:
+        kind = st.get('codec_type', '?')[:1]
+        counts[kind] = counts.get(kind, 0) + 1
+    
+    duration = fmt.get('duration') or video.get('duration')
+    bitrate = fmt.get('bit_rate')
+    return {
+        'duration': float(duration) if duration else None,
+        'format': fmt.get('format_name'),
+        'bitrate': int(bitrate) if bitrate else None,
+        'vcodec': video.get('codec_name'),
+        'vbitrate': int(video['bit_rate']) if video.get('bit_rate') else None,
+        'pix_fmt': video.get('pix_fmt'),
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'fps': parse_fps(video.get('avg_frame_rate', '')),
+        'acodec': audio.get('codec_name'),
+        'abitrate': int(audio['bit_rate']) if audio.get('bit_rate') else None,
+        'acodecs': sorted({st.get('codec_name') for st in streams
+                           if st.get('codec_type') == 'audio' and st.get('codec_name')}),
+        'streams': ' '.join(f"{n}{kind}" for kind, n in
+                            sorted(counts.items(), key=lambda item: 'vasd'.find(item[0]) % 5)),
+    }
+
+
+class MediaInfoCache:
+    """Cache persistant des métadonnées ffprobe (JSON dans le dossier de config)
+    
+    Une entrée est valide tant que la taille et la date de modification du
+    fichier n'ont pas changé; sinon le fichier est analysé à nouveau.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_config_dir(), 'media_cache.json')
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+    
+    def get(self, path, stat=None):
+        """Métadonnées en cache pour `path`, ou None si absentes/périmées"""
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['info']
+        return None
+    
+    def put(self, path, stat, info):
+        with self._lock:
+            self._entries[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'info': info}
+            self._dirty = True
+    
+    def save(self):
+        """Écrire le cache sur disque (remplacement atomique)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries)
+            self._dirty = False
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+
+class ProbePool:
+    """Pool borné de processus ffprobe qui remplit un MediaInfoCache"""
+    
+    def __init__(self, cache, ffprobe='ffprobe', workers=PROBE_WORKERS, on_result=None):
+        self.cache = cache
+        self.ffprobe = ffprobe
+        self.on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = set()
+        self._lock = threading.Lock()
+    
+    def request(self, path):
+        """Analyser `path` en arrière-plan s'il n'est pas déjà en cache ou en cours"""
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._executor.submit(self._probe, path)
+    
+    def _probe(self, path):
+        info = None
+        try:
+            stat = os.stat(path)
+            info = self.cache.get(path, stat)
+            if info is None:
+                info = probe_media(self.ffprobe, path)
+                self.cache.put(path, stat, info)
+        except Exception:
+            info = None
+        
+        with self._lock:
+            self._pending.discard(path)
+            idle = not self._pending
+        if idle:
+            self.cache.save()
+        if self.on_result:
+            self.on_result(path, info)
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.save()
+
+
+
+
+class EncodeSettings:
+    """Paramètres d'encodage, indépendants de l'interface graphique
+    
+    Les valeurs par défaut sont celles de l'interface. Un préset JSON ne
+    contient que les clés à modifier.
+    """
+    DEFAULTS = {
+        'ffmpeg_path': 'ffmpeg',
+        'video_encoder': 'h264_nvenc',
+        'crf': 23,
+        'max_bitrate': '0',
+        'preset': 'medium',
+        'audio_codec': 'aac',
+        'audio_bitrate': '128',
+        'scale': '',
+        'fps': '',
+        'extra_filters': '',
+        'output_suffix': '_encoded',
+        'overwrite': True,
+        'keep_structure': False,
+        'two_pass': False,
+        'incremental': False,
+        'max_jobs': 2,
+        'max_hw_jobs': 2,
+        'max_sw_jobs': 1,
+        'segments': 0,
+        'segment_min_duration': 600,
+        'hw_pipeline': True,
+        'smart_copy': False,
+        'first_pass_preset': '',
+        'write_report': False,
+        'size_ratio': 1.0,
+        'stage_dir': '',
+        'stage_ahead': 2,
+        'stage_max_size': 20,
+        'target_quality': 0,
+        'quality_metric': 'vmaf',
+        'quality_samples': 3,
+        'quality_sample_duration': 4,
+        'ladder': '',
+        'server': '',
+    }
+    
+    def __init__(self, **values):
+        unknown = set(values) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus: {', '.join(sorted(unknown))}")
+        for key, default in self.DEFAULTS.items():
+            setattr(self, key, values.get(key, default))
+    
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.DEFAULTS}
+    
+    @classmethod
+    def load(cls, path):
+        """Charger un préset JSON"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(**json.load(f))
+    
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class PresetStore:
+    """Présets nommés, un fichier JSON par préset dans le dossier de configuration"""
+    
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(get_config_dir(), 'presets')
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _path(self, name):
+        if not name or name != os.path.basename(name) or name.startswith('.'):
+            raise ValueError(f"Nom de préset invalide: {name!r}")
+        return os.path.join(self.directory, f"{name}.json")
+    
+    def names(self):
+        return sorted(os.path.splitext(entry)[0] for entry in os.listdir(self.directory)
+                      if entry.endswith('.json') and not entry.startswith('.'))
+    
+    def load(self, name):
+        return EncodeSettings.load(self._path(name))
+    
+    def save(self, name, settings):
+        """Enregistrer un préset (remplacement atomique)"""
+        path = self._path(name)
+        tmp = os.path.join(self.directory, f".{name}.json.tmp")
+        settings.save(tmp)
+        os.replace(tmp, path)
+    
+    def delete(self, name):
+        os.remove(self._path(name))
+
+
+def uses_two_runs(settings):
+    """Vrai si les deux passes sont deux exécutions de FFmpeg
+    
+    NVENC fait ses deux passes en interne (-multipass); les encodeurs
+    logiciels ont besoin d'un débit cible (débit max) pour la passe 2.
+    """
+    return (settings.two_pass and not settings.target_quality and settings.video_encoder in TWO_PASS_ENCODERS
+            and bool(settings.max_bitrate) and settings.max_bitrate != "0")
+
+
+def encoder_args(settings, pass_number=None, passlog=None):
+    """Options de l'encodeur vidéo: codec, préset, qualité et débit max
+    
+    Avec pass_number, la qualité constante est remplacée par le débit max
+    comme débit cible et la passe 1 peut utiliser un préset plus rapide.
+    """
+    preset = settings.preset
+    if pass_number == 1 and settings.first_pass_preset:
+        preset = settings.first_pass_preset
+    args = ['-c:v', settings.video_encoder, '-preset', preset]
+    
+    if pass_number:
+        args.extend(['-b:v', f"{settings.max_bitrate}k"])
+        if settings.video_encoder == 'libx265':
+            args.extend(['-x265-params', f"pass={pass_number}:stats={passlog}.log"])
+        else:
+            args.extend(['-pass', str(pass_number), '-passlogfile', passlog])
+    else:
+        args.extend(quality_args(settings.video_encoder, settings.crf))
+        if settings.two_pass and settings.video_encoder.endswith('_nvenc'):
+            args.extend(['-multipass', 'fullres'])
+    
+    # Débit max
+    if settings.max_bitrate and settings.max_bitrate != "0":
+        args.extend(['-maxrate', f"{settings.max_bitrate}k"])
+    
+    return args
+
+
+def quality_args(encoder, value):
+    """Options de qualité constante de l'encodeur
+    
+    NVENC ignore -crf: sa qualité constante est -cq en VBR sans débit cible.
+    """
+    if encoder.endswith('_nvenc'):
+        return ['-rc', 'vbr', '-cq', str(value), '-b:v', '0']
+    return ['-crf', str(value)]
+
+
+def with_quality(cmd, value):
+    """Copie de la commande avec une autre valeur de qualité constante"""
+    cmd = list(cmd)
+    for i, arg in enumerate(cmd[:-1]):
+        if arg in ('-crf', '-cq'):
+            cmd[i + 1] = str(value)
+    return cmd
+
+
+def container_accepts(output_file, codec):
+    accepted = CONTAINER_CODECS.get(os.path.splitext(output_file)[1].lower())
+    return accepted is None or codec in accepted
+
+
+def can_copy_video(settings, info, output_file):
+    """Vrai si le flux vidéo source peut être copié tel quel
+    
+    La source doit déjà être dans le codec visé, sans filtre demandé, sous le
+    débit maximal et dans un codec accepté par le conteneur de sortie.
+    """
+    if not settings.smart_copy or not info:
+        return False
+    if settings.scale or settings.fps or settings.extra_filters:
+        return False
+    if info.get('vcodec') != ENCODER_CODECS.get(settings.video_encoder):
+        return False
+    if not container_accepts(output_file, info['vcodec']):
+        return False
+    if settings.max_bitrate and settings.max_bitrate != "0":
+        bitrate = info.get('vbitrate') or info.get('bitrate')
+        try:
+            if not bitrate or bitrate > int(settings.max_bitrate) * 1000:
+                return False
+        except ValueError:
+            return False
+    return True
+
+
+def can_copy_audio(settings, info, output_file):
+    """Vrai si tous les flux audio sont déjà au codec et au débit demandés"""
+    if not settings.smart_copy or not info or not info.get('acodecs'):
+        return False
+    if info['acodecs'] != [settings.audio_codec]:
+        return False
+    if not container_accepts(output_file, settings.audio_codec):
+        return False
+    try:
+        return bool(info.get('abitrate')) and info['abitrate'] <= int(settings.audio_bitrate) * 1000
+    except ValueError:
+        return False
+
+
+def can_use_gpu_pipeline(settings, capabilities, info):
+    """Vrai si décodage + mise à l'échelle peuvent rester sur le GPU
+    
+    Il faut un encodeur NVENC, le hwaccel CUDA, un filtre scale_cuda ou
+    scale_npp (si l'image est redimensionnée: échelle ou paliers), une
+    source décodable par NVDEC et aucun filtre logiciel supplémentaire (qui
+    imposerait un aller-retour vers la mémoire CPU).
+    """
+    if not settings.hw_pipeline or not capabilities or not info:
+        return False
+    if not settings.video_encoder.endswith('_nvenc') or settings.extra_filters:
+        return False
+    if 'cuda' not in capabilities.get('hwaccels', []):
+        return False
+    filters = capabilities.get('filters', [])
+    if (settings.scale or settings.ladder) and not ('scale_cuda' in filters or 'scale_npp' in filters):
+        return False
+    if settings.scale and not GPU_SCALE_RE.match(settings.scale):
+        return False
+    return info.get('vcodec') in NVDEC_CODECS and info.get('pix_fmt') in NVDEC_PIX_FMTS
+
+
+def plan_pipeline(settings, capabilities=None, info=None, cpu_count=None, output_file='',
+                  pass_number=None, passlog=None):
+    """Planifier la chaîne décodage -> filtres -> encodage
+    
+    Renvoie (options d'entrée, options vidéo de sortie, description). Une
+    fonction pure: les capacités de FFmpeg et les métadonnées de la source
+    sont passées en paramètres, ce qui permet de vérifier les commandes sans GPU.
+    """
+    if can_copy_video(settings, info, output_file):
+        return [], ['-c:v', 'copy'], "copie du flux vidéo"
+    
+    if can_use_gpu_pipeline(settings, capabilities, info):
+        input_args = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+        video_filters = []
+        if settings.scale:
+            scaler = 'scale_cuda' if 'scale_cuda' in capabilities['filters'] else 'scale_npp'
+            video_filters.append(f"{scaler}={settings.scale}")
+        # fps ne touche pas aux images: il fonctionne aussi sur des images CUDA
+        if settings.fps:
+            video_filters.append(f"fps={settings.fps}")
+        output_args = ['-vf', ','.join(video_filters)] if video_filters else []
+        return (input_args, output_args + encoder_args(settings, pass_number, passlog),
+                "GPU (décodage + filtres CUDA)")
+    
+    # Chaîne logicielle: répartir les cœurs entre les encodages simultanés
+    cpu_count = cpu_count or os.cpu_count() or 1
+    threads = max(1, cpu_count // max(1, settings.max_jobs))
+    input_args = ['-threads', str(threads)]
+    video_filters = []
+    
+    # Échelle
+    if settings.scale:
+        video_filters.append(f"scale={settings.scale}")
+    
+    # FPS
+    if settings.fps:
+        video_filters.append(f"fps={settings.fps}")
+    
+    # Filtres supplémentaires
+    if settings.extra_filters:
+        video_filters.append(settings.extra_filters)
+    
+    output_args = []
+    if video_filters:
+        output_args.extend(['-vf', ','.join(video_filters), '-filter_threads', str(threads)])
+    output_args.extend(encoder_args(settings, pass_number, passlog))
+    if not settings.video_encoder.endswith('_nvenc'):
+        output_args.extend(['-threads', str(threads)])
+    return input_args, output_args, f"CPU ({threads} threads)"
+
+
+def audio_args(settings, info=None, output_file=''):
+    """Options audio"""
+    if settings.audio_codec == 'copy' or can_copy_audio(settings, info, output_file):
+        return ['-c:a', 'copy']
+    return ['-c:a', settings.audio_codec, '-b:a', f"{settings.audio_bitrate}k"]
+
+
+def base_command(settings):
+    """Début commun des commandes: progression lisible sur stdout"""
+    return [settings.ffmpeg_path, '-hide_banner', '-nostats', '-progress', 'pipe:1']
+
+
+def filter_names(chain):
+    """Noms des filtres d'une chaîne -vf (les virgules entre guillemets ou crochets sont ignorées)"""
+    parts = []
+    current = ''
+    quoted = False
+    depth = 0
+    for char in chain:
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == '[':
+            depth += 1
+        elif not quoted and char == ']':
+            depth -= 1
+        elif not quoted and depth == 0 and char in ',;':
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    if quoted or depth:
+        raise ValueError("guillemets ou crochets non fermés")
+    parts.append(current)
+    
+    names = []
+    for part in parts:
+        name = re.sub(r'^(\s*\[[^\]]*\])*', '', part).split('=', 1)[0].strip().split('@')[0]
+        if not name:
+            raise ValueError("filtre vide")
+        names.append(name)
+    return names
+
+
+def validate_settings(settings, capabilities=None):
+    """Erreurs des paramètres (liste vide si valides)
+    
+    Les bornes numériques et la syntaxe des champs libres sont toujours
+    vérifiées; encodeurs, présets et filtres le sont contre les capacités
+    de FFmpeg quand elles sont connues.
+    """
+    errors = []
+    caps = capabilities if capabilities and capabilities.get('available') else None
+    
+    def number(key, value=None):
+        try:
+            return float(getattr(settings, key) if value is None else value)
+        except (TypeError, ValueError):
+            errors.append(f"{key}: nombre attendu ({getattr(settings, key)!r})")
+            return None
+    
+    for key, (low, high) in SETTING_RANGES.items():
+        value = number(key)
+        if value is not None and (value < low or (high is not None and value > high)):
+            errors.append(f"{key}: {value:g} hors de [{low:g}, {high:g}]" if high is not None
+                          else f"{key}: {value:g} inférieur à {low:g}")
+    
+    crf = number('crf')
+    crf_max = CRF_MAX.get(settings.video_encoder, 51)
+    if crf is not None and not 0 <= crf <= crf_max:
+        errors.append(f"crf: {crf:g} hors de [0, {crf_max}] pour {settings.video_encoder}")
+    for key in ('max_bitrate', 'audio_bitrate'):
+        if not str(getattr(settings, key)).isdigit():
+            errors.append(f"{key}: débit entier en kbps attendu ({getattr(settings, key)!r})")
+    suffix = str(settings.output_suffix)
+    if '..' in suffix or any(sep in suffix for sep in ('/', '\\', os.sep)):
+        # Le suffixe ne doit pas faire sortir le fichier du dossier de sortie
+        errors.append(f"output_suffix: séparateur de chemin ou « .. » interdit ({suffix!r})")
+    
+    if settings.target_quality:
+        target = number('target_quality')
+        if settings.quality_metric not in QUALITY_METRICS:
+            errors.append(f"quality_metric: {settings.quality_metric!r} (attendu: {', '.join(QUALITY_METRICS)})")
+        elif target is not None:
+            high = 100 if settings.quality_metric == 'vmaf' else 1
+            if not 0 < target <= high:
+                errors.append(f"target_quality: {target:g} hors de ]0, {high}] pour {settings.quality_metric}")
+    
+    if settings.scale and not SCALE_RE.match(settings.scale):
+        errors.append(f"scale: {settings.scale!r} (attendu: largeur:hauteur, ex: 1280:-2)")
+    if settings.fps and not FPS_RE.match(str(settings.fps)):
+        errors.append(f"fps: {settings.fps!r} (attendu: nombre ou fraction, ex: 30 ou 30000/1001)")
+    filters = []
+    if settings.extra_filters:
+        try:
+            filters = filter_names(settings.extra_filters)
+        except ValueError as e:
+            errors.append(f"extra_filters: {e}")
+    try:
+        parse_ladder(settings.ladder)
+    except ValueError as e:
+        errors.append(f"ladder: {e}")
+    if settings.two_pass and not settings.target_quality and not settings.video_encoder.endswith('_nvenc'):
+        # Sans cela la case serait ignorée et l'encodage ferait une seule passe à qualité constante
+        if settings.video_encoder not in TWO_PASS_ENCODERS:
+            errors.append(f"two_pass: deux passes non gérées pour {settings.video_encoder}")
+        elif not settings.max_bitrate or settings.max_bitrate == "0":
+            errors.append(f"two_pass: un débit max (débit cible) est requis pour {settings.video_encoder}")
+    if str(settings.segments).isdigit() and int(settings.segments) > 1 and uses_two_runs(settings):
+        # Chaque segment est encodé en une passe: deux passes logicielles seraient ignorées
+        errors.append("segments: incompatible avec l'encodage en deux passes de "
+                      f"{settings.video_encoder} (désactiver l'un des deux)")
+    
+    if capabilities is not None and capabilities.get('available') is False:
+        errors.append(f"ffmpeg_path: FFmpeg introuvable ou inutilisable ({settings.ffmpeg_path})")
+    if caps:
+        if settings.video_encoder not in caps['encoders']:
+            errors.append(f"video_encoder: {settings.video_encoder} absent de FFmpeg")
+        elif caps['presets'].get(settings.video_encoder) and settings.preset not in caps['presets'][settings.video_encoder]:
+            errors.append(f"preset: {settings.preset!r} inconnu de {settings.video_encoder}")
+        if settings.audio_codec != 'copy' and settings.audio_codec not in caps['encoders']:
+            errors.append(f"audio_codec: {settings.audio_codec} absent de FFmpeg")
+        for name in filters:
+            if name not in caps['filters']:
+                errors.append(f"extra_filters: filtre inconnu de FFmpeg: {name}")
+    return errors
+
+
+class CommandTemplate:
+    """Paramètres compilés en modèle de commande FFmpeg
+    
+    Les options ne dépendent des fichiers que par trois décisions (copie
+    vidéo, chaîne GPU, copie audio): elles sont calculées une fois par
+    combinaison, puis chaque commande est le modèle rempli avec les chemins.
+    """
+    
+    def __init__(self, settings, capabilities=None):
+        self.settings = settings
+        self.capabilities = capabilities
+        self._base = base_command(settings)
+        self._plans = {}
+    
+    def plan(self, info=None, output_file=''):
+        """(options d'entrée, options de sortie vidéo et audio, description) d'un fichier"""
+        settings = self.settings
+        key = (can_copy_video(settings, info, output_file),
+               can_use_gpu_pipeline(settings, self.capabilities, info),
+               can_copy_audio(settings, info, output_file),
+               os.path.splitext(output_file)[1].lower())
+        plan = self._plans.get(key)
+        if plan is None:
+            input_args, output_args, label = plan_pipeline(settings, self.capabilities, info,
+                                                           output_file=output_file)
+            plan = (input_args, output_args + audio_args(settings, info, output_file), label)
+            self._plans[key] = plan
+        return plan
+    
+    def build(self, input_file, output_file, info=None):
+        input_args, output_args, _ = self.plan(info, output_file)
+        # FFmpeg écrit un fichier temporaire: l'écrasement de la sortie finale
+        # est décidé avant le lancement (voir prepare_jobs)
+        return self._base + input_args + ['-i', input_file] + output_args + ['-y', output_file]
+
+
+def compile_settings(settings, capabilities=None):
+    """Valider les paramètres et les compiler en CommandTemplate (ValueError si invalides)"""
+    errors = validate_settings(settings, capabilities)
+    if errors:
+        raise ValueError("\n".join(errors))
+    return CommandTemplate(settings, capabilities)
+
+
+def build_ffmpeg_command(settings, input_file, output_file, capabilities=None, info=None):
+    """Construire la commande FFmpeg"""
+    return CommandTemplate(settings, capabilities).build(input_file, output_file, info)
+
+
+def get_output_filename(settings, output_folder, input_file):
+    """Générer le nom de fichier de sortie"""
+    input_path = Path(input_file)
+    output_filename = f"{input_path.stem}{settings.output_suffix}{input_path.suffix}"
+    
+    if settings.keep_structure:
+        # Conserver la structure des dossiers
+        relative_path = input_path.relative_to(input_path.anchor)
+        output_path = Path(output_folder) / relative_path.parent / output_filename
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        # Juste dans le dossier de sortie
+        output_path = Path(output_folder) / output_filename
+    
+    return str(output_path)
+
+
+def parse_ladder(text):
+    """Paliers "HAUTEUR[:DÉBIT_MAX]" séparés par des virgules -> [(hauteur, débit max ou None)]"""
+    ladder = []
+    for item in text.replace(' ', '').split(','):
+        if not item:
+            continue
+        height, _, bitrate = item.partition(':')
+        height = height.lower().rstrip('p')
+        if not height.isdigit() or (bitrate and not bitrate.isdigit()):
+            raise ValueError(f"Palier invalide: {item} (attendu: hauteur[:débit max], ex: 720:3000)")
+        ladder.append((int(height), bitrate or None))
+    return ladder
+
+
+def ladder_output_name(output_file, height):
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}_{height}p{ext}"
+
+
+def build_ladder_command(settings, input_file, outputs, capabilities=None, info=None):
+    """Commande produisant tous les paliers d'un fichier en un seul décodage
+    
+    `outputs`: [(hauteur, débit max, fichier)]. Les filtres communs sont
+    appliqués une fois, puis `split` alimente une mise à l'échelle et un
+    encodeur par palier. L'échelle des paramètres est remplacée par celle
+    des paliers.
+    """
+    threads = None
+    if can_use_gpu_pipeline(settings, capabilities, info):
+        input_args = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+        scaler = 'scale_cuda' if 'scale_cuda' in capabilities['filters'] else 'scale_npp'
+        common = [f"fps={settings.fps}"] if settings.fps else []
+    else:
+        threads = max(1, (os.cpu_count() or 1) // max(1, settings.max_jobs))
+        input_args = ['-threads', str(threads)]
+        scaler = 'scale'
+        common = [f"fps={settings.fps}"] if settings.fps else []
+        if settings.extra_filters:
+            common.append(settings.extra_filters)
+    
+    common.append(f"split={len(outputs)}")
+    graph = "[0:v:0]" + ','.join(common) + ''.join(f"[v{i}]" for i in range(len(outputs)))
+    for i, (height, _, _) in enumerate(outputs):
+        graph += f";[v{i}]{scaler}=-2:{height}[o{i}]"
+    
+    cmd = base_command(settings) + input_args + ['-i', input_file, '-filter_complex', graph]
+    if threads:
+        cmd.extend(['-filter_complex_threads', str(threads)])
+    for i, (height, bitrate, output_file) in enumerate(outputs):
+        rendition = EncodeSettings(**settings.to_dict())
+        rendition.max_bitrate = bitrate or settings.max_bitrate
+        cmd.extend(['-map', f"[o{i}]", '-map', '0:a:0?'])
+        cmd.extend(encoder_args(rendition))
+        if threads and not settings.video_encoder.endswith('_nvenc'):
+            cmd.extend(['-threads', str(threads)])
+        cmd.extend(audio_args(settings, info, output_file))
+        cmd.extend(['-y', output_file])
+    return cmd
+
+
+def plan_ladder_job(settings, input_file, output_file, ladder, capabilities=None, info=None):
+    """Un travail pour tous les paliers d'un fichier (sortie principale: premier palier)"""
+    outputs = [(height, bitrate, ladder_output_name(output_file, height)) for height, bitrate in ladder]
+    temps = [temp_output_name(path) for _, _, path in outputs]
+    renditions = [(height, bitrate, temp) for (height, bitrate, _), temp in zip(outputs, temps)]
+    cmd = build_ladder_command(settings, input_file, renditions, capabilities, info)
+    job = EncodeJob(input_file, outputs[0][2], cmd, settings.video_encoder)
+    job.temp_file = temps[0]
+    job.extra_outputs = [(temp, path) for (_, _, path), temp in zip(outputs[1:], temps[1:])]
+    chain = "GPU" if can_use_gpu_pipeline(settings, capabilities, info) else "CPU"
+    label = f"paliers {'/'.join(f'{height}p' for height, _ in ladder)} (un seul décodage)"
+    job.pipeline = f"{chain}, {label}"
+    fallback = software_settings(settings, capabilities)
+    if fallback:
+        job.fallback = SoftwareFallback(
+            fallback, partial(build_ladder_command, fallback, input_file, renditions, capabilities, info),
+            f"CPU, {label}")
+    
+    try:
+        input_size = os.path.getsize(input_file)
+    except OSError:
+        input_size = 0
+    source_height = info.get('height') if info else None
+    job.estimated_size = 0
+    for height, bitrate in ladder:
+        rendition = EncodeSettings(**settings.to_dict())
+        rendition.max_bitrate = bitrate or settings.max_bitrate
+        share = min(1.0, (height / source_height) ** 2) if source_height else 1.0
+        job.estimated_size += estimate_output_size(rendition, info, int(input_size * share)) or 0
+    return job
+
+
+def probe_keyframes(ffprobe, path):
+    """Instants (s) des images clés du premier flux vidéo, sans décodage"""
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+         '-of', 'csv=p=0', path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe code {result.returncode}")
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def split_points(keyframes, duration, count):
+    """Choisir count-1 images clés proches d'un découpage régulier"""
+    points = []
+    for i in range(1, count):
+        target = duration * i / count
+        best = min(keyframes, key=lambda t: abs(t - target), default=None)
+        if best is not None and best > (points[-1] if points else 0.0) and best < duration:
+            points.append(best)
+    return points
+
+
+def count_video_frames(ffprobe, path):
+    """Nombre de paquets du premier flux vidéo (lecture sans décodage)"""
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+         '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', path],
+        capture_output=True, text=True
+    )
+    try:
+        return int(result.stdout.strip().split(',')[0])
+    except ValueError:
+        return None
+
+
+def verify_joined_output(ffprobe, source_info, output_file, segments, compare_frames, source_frames=None):
+    """Vérifier la durée (et le nombre d'images) du fichier assemblé"""
+    info = probe_media(ffprobe, output_file)
+    fps = source_info.get('fps') or 25.0
+    # Une image d'écart par point de coupe est tolérée
+    tolerance = max(0.5, segments / fps)
+    if info['duration'] is None or abs(info['duration'] - source_info['duration']) > tolerance:
+        raise RuntimeError(f"durée assemblée {info['duration']} ≠ source {source_info['duration']}")
+    if compare_frames and source_frames:
+        frames = count_video_frames(ffprobe, output_file)
+        if frames is None or abs(frames - source_frames) > segments:
+            raise RuntimeError(f"images assemblées {frames} ≠ source {source_frames}")
+
+
+def plan_segmented_jobs(settings, job, info, ffprobe, capabilities=None):
+    """Découper un long fichier en segments encodés en parallèle
+    
+    Les segments commencent sur des images clés et sont encodés sans audio;
+    l'audio est encodé en une seule passe puis le tout est assemblé par le
+    démuxeur concat (copie de flux) et vérifié. Renvoie None si le fichier
+    ne peut pas être découpé.
+    """
+    input_file, output_file = job.input_file, job.output_file
+    keyframes = probe_keyframes(ffprobe, input_file)
+    points = split_points(keyframes, info['duration'], settings.segments)
+    if not points:
+        return None
+    
+    plan = plan_pipeline(settings, capabilities, info)
+    fallback = software_settings(settings, capabilities)
+    fallback_plan = plan_pipeline(fallback, capabilities, info) if fallback else None
+    
+    def segment_command(plan, start, end, segment):
+        input_args, output_args, _ = plan
+        return (base_command(settings) + input_args + ['-ss', f"{start:.6f}", '-t', f"{end - start:.6f}",
+                                                      '-i', input_file, '-map', '0:v:0']
+                + output_args + ['-an', '-sn', '-y', segment])
+    
+    work_dir = tempfile.mkdtemp(prefix='.fmmp_segments_', dir=os.path.dirname(output_file) or '.')
+    bounds = [0.0] + points + [info['duration']]
+    jobs = []
+    list_file = os.path.join(work_dir, 'segments.txt')
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for i, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            segment = os.path.join(work_dir, f"segment_{i:03d}.mkv")
+            escaped = segment.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+            part = EncodeJob(input_file, segment, segment_command(plan, start, end, segment),
+                             settings.video_encoder)
+            part.pipeline = plan[2]
+            if fallback:
+                part.fallback = SoftwareFallback(
+                    fallback, partial(segment_command, fallback_plan, start, end, segment), fallback_plan[2])
+            part.part = f"{i + 1}/{len(bounds) - 1}"
+            part.duration = end - start
+            part.signature = None
+            part.final = False
+            if job.estimated_size:
+                part.estimated_size = int(job.estimated_size * part.duration / info['duration'])
+            jobs.append(part)
+    
+    parts = list(jobs)
+    has_audio = bool(info.get('acodec'))
+    if has_audio:
+        audio_file = os.path.join(work_dir, 'audio.mka')
+        cmd = base_command(settings) + ['-i', input_file, '-vn', '-sn', '-map', '0:a?']
+        cmd.extend(audio_args(settings))
+        cmd.extend(['-y', audio_file])
+        audio_job = EncodeJob(input_file, audio_file, cmd, settings.audio_codec)
+        audio_job.part = "audio"
+        audio_job.duration = info['duration']
+        audio_job.signature = None
+        audio_job.final = False
+        audio_job.light = True
+        parts.append(audio_job)
+    
+    cmd = base_command(settings) + ['-f', 'concat', '-safe', '0', '-i', list_file]
+    if has_audio:
+        cmd.extend(['-i', audio_file, '-map', '0:v', '-map', '1:a'])
+    cmd.extend(['-c', 'copy', '-y', job.temp_file])
+    join = EncodeJob(input_file, output_file, cmd, 'copy')
+    join.temp_file = job.temp_file
+    join.estimated_size = job.estimated_size
+    join.part = "assemblage"
+    join.light = True
+    join.depends_on = parts
+    # Le manifeste compare la commande d'un encodage normal du fichier
+    join.signature = job.signature
+    source_frames = count_video_frames(ffprobe, input_file) if not settings.fps else None
+    join.verify = lambda job: verify_joined_output(
+        ffprobe, info, job.temp_file, len(bounds) - 1, not settings.fps, source_frames)
+    join.cleanup = lambda job: shutil.rmtree(work_dir, ignore_errors=True)
+    return parts + [join]
+
+
+def temp_output_name(output_file):
+    """Nom temporaire (caché, même dossier, même extension) d'un fichier de sortie"""
+    directory, name = os.path.split(output_file)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}{TEMP_MARK}{ext}")
+
+
+def estimate_output_size(settings, info, input_size):
+    """Taille de sortie estimée: débit cible × durée, sinon taille d'entrée × ratio"""
+    duration = info.get('duration') if info else None
+    try:
+        video_kbps = int(settings.max_bitrate or 0)
+        audio_kbps = int(settings.audio_bitrate or 0) if settings.audio_codec != 'copy' else 0
+    except ValueError:
+        video_kbps = audio_kbps = 0
+    if duration and video_kbps:
+        return int((video_kbps + audio_kbps) * 1000 / 8 * duration)
+    if input_size:
+        return int(input_size * float(settings.size_ratio))
+    return None
+
+
+def estimate_job_cost(job, info=None, input_size=None):
+    """Coût d'un travail: durée × pixels (relatifs au 1080p) / vitesse de référence de l'encodeur
+    
+    Sans durée connue, la durée est estimée depuis la taille (environ 8 Mb/s).
+    """
+    duration = job.duration or (info.get('duration') if info else None)
+    if not duration:
+        duration = (input_size or 0) / 1e6
+    pixels = 1.0
+    if job.encoder in ENCODER_CODECS and info and info.get('width') and info.get('height'):
+        pixels = info['width'] * info['height'] / (1920 * 1080)
+    return duration * pixels / ENCODER_SPEEDS.get(job.encoder, 1.0)
+
+
+def plan_two_pass_jobs(settings, job, capabilities=None, info=None):
+    """Remplacer un travail par deux passes avec un fichier de statistiques isolé
+    
+    La passe 1 écrit vers le muxeur null; la passe 2 dépend de la passe 1.
+    L'ordonnanceur peut ainsi lancer la passe 1 du fichier suivant pendant
+    la passe 2 du fichier courant.
+    """
+    stats_dir = tempfile.mkdtemp(prefix='fmmp_passlog_')
+    passlog = os.path.join(stats_dir, 'passlog')
+    jobs = []
+    for pass_number in (1, 2):
+        input_args, output_args, pipeline = plan_pipeline(
+            settings, capabilities, info, output_file=job.output_file,
+            pass_number=pass_number, passlog=passlog)
+        cmd = base_command(settings) + input_args + ['-i', job.input_file] + output_args
+        if pass_number == 1:
+            cmd.extend(['-an', '-sn', '-f', 'null', '-'])
+        else:
+            cmd.extend(audio_args(settings, info, job.output_file))
+            cmd.extend(['-y', job.temp_file])
+        pass_job = EncodeJob(job.input_file, '-' if pass_number == 1 else job.output_file, cmd,
+                             settings.video_encoder)
+        pass_job.part = f"passe {pass_number}"
+        pass_job.duration = job.duration
+        pass_job.pipeline = f"{pipeline}, passe {pass_number}/2"
+        jobs.append(pass_job)
+    
+    first, second = jobs
+    first.signature = None
+    first.final = False
+    second.temp_file = job.temp_file
+    second.estimated_size = job.estimated_size
+    second.depends_on = [first]
+    second.signature = job.signature
+    second.cleanup = lambda j: shutil.rmtree(stats_dir, ignore_errors=True)
+    return jobs
+
+
+def sample_windows(duration, count, length):
+    """Fenêtres (début, durée) réparties sur la source pour la recherche de qualité"""
+    count = max(1, int(count))
+    length = float(length)
+    if not duration or duration <= length * count:
+        return [(0.0, duration or length)]
+    return [(max(0.0, duration * (i + 0.5) / count - length / 2), length) for i in range(count)]
+
+
+def run_child(cmd, job=None, timeout=QUALITY_SAMPLE_TIMEOUT):
+    """Lancer un FFmpeg auxiliaire dans le créneau de `job`: (code de retour, stderr)
+    
+    Le processus est rattaché au travail (job.process) pour que stop() et
+    cancel() l'arrêtent; il est tué au-delà de `timeout` secondes.
+    """
+    if job is not None and job.stop_requested:
+        raise RuntimeError("travail arrêté")
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if job is not None:
+        job.process = process
+        if job.stop_requested:
+            process.terminate()
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise RuntimeError(f"FFmpeg sans réponse après {timeout} s: {' '.join(cmd[:4])}…")
+    if job is not None and job.stop_requested:
+        raise RuntimeError("travail arrêté")
+    return process.returncode, stderr
+
+
+def score_sample(settings, input_file, sample_file, start, length, job=None):
+    """Note (VMAF 0-100 ou SSIM 0-1) d'un échantillon encodé contre la même fenêtre de la source"""
+    metric = 'libvmaf' if settings.quality_metric == 'vmaf' else 'ssim'
+    reference = f"fps={settings.fps}," if settings.fps else ''
+    graph = (f"[0:v]format=yuv420p[d0];[1:v]{reference}format=yuv420p[r0];"
+             f"[d0][r0]scale2ref=flags=bicubic[d][r];[d][r]{metric}")
+    cmd = [settings.ffmpeg_path, '-hide_banner', '-nostats', '-i', sample_file,
+           '-ss', f"{start:.3f}", '-t', f"{length:.3f}", '-i', input_file,
+           '-lavfi', graph, '-f', 'null', '-']
+    returncode, stderr = run_child(cmd, job)
+    match = (VMAF_RE if metric == 'libvmaf' else SSIM_RE).search(stderr)
+    if returncode != 0 or not match:
+        raise RuntimeError(f"mesure {settings.quality_metric} impossible (code {returncode})")
+    return float(match.group(1))
+
+
+def quality_cache_key(settings):
+    """Clé des résultats de recherche: paramètres qui influencent la note"""
+    keys = ('video_encoder', 'preset', 'scale', 'fps', 'extra_filters', 'hw_pipeline', 'max_bitrate',
+            'target_quality', 'quality_metric', 'quality_samples', 'quality_sample_duration')
+    return command_hash([f"{key}={getattr(settings, key)}" for key in keys])
+
+
+def search_quality(settings, input_file, info, capabilities=None, job=None):
+    """Valeur de qualité constante la plus économe qui atteint la note cible
+    
+    Recherche dichotomique: à chaque valeur candidate, quelques fenêtres
+    courtes de la source sont encodées et notées l'une après l'autre, dans
+    le créneau de `job` (un seul encodeur à la fois, arrêtable); la plus haute
+    valeur (le débit le plus faible) dont la note moyenne atteint la cible
+    est retenue. Renvoie (valeur, note); si la cible n'est jamais atteinte,
+    la meilleure qualité de la plage.
+    """
+    if (settings.quality_metric == 'vmaf' and capabilities and capabilities.get('available')
+            and 'libvmaf' not in capabilities['filters']):
+        raise RuntimeError("FFmpeg n'a pas le filtre libvmaf (choisir ssim)")
+    low, high = QUALITY_RANGES.get(settings.video_encoder, QUALITY_RANGE)
+    windows = sample_windows(info.get('duration'), settings.quality_samples, settings.quality_sample_duration)
+    input_args, output_args, _ = plan_pipeline(settings, capabilities, info)
+    target = float(settings.target_quality)
+    work_dir = tempfile.mkdtemp(prefix='fmmp_quality_')
+    
+    def measure(value, index, window):
+        start, length = window
+        sample = os.path.join(work_dir, f"q{value}_{index}.mkv")
+        cmd = [settings.ffmpeg_path, '-hide_banner', '-nostats', '-loglevel', 'error'] + input_args
+        cmd.extend(['-ss', f"{start:.3f}", '-t', f"{length:.3f}", '-i', input_file, '-map', '0:v:0'])
+        cmd.extend(with_quality(output_args, value))
+        cmd.extend(['-an', '-sn', '-y', sample])
+        try:
+            returncode, stderr = run_child(cmd, job)
+            if returncode != 0:
+                raise RuntimeError(f"échantillon de qualité {value}: {stderr.strip()[-200:]}")
+            return score_sample(settings, input_file, sample, start, length, job)
+        finally:
+            if os.path.exists(sample):
+                os.remove(sample)
+    
+    best = fallback = None
+    try:
+        while low <= high:
+            value = (low + high) // 2
+            scores = [measure(value, index, window) for index, window in enumerate(windows)]
+            score = sum(scores) / len(scores)
+            if score >= target:
+                best = (value, score)
+                low = value + 1
+            else:
+                fallback = (value, score)
+                high = value - 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return best or fallback
+
+
+class QualitySearch:
+    """Recherche de qualité d'un fichier, faite une fois pour tous ses travaux
+    
+    Sert de crochet `prepare` des travaux: la recherche se fait dans le
+    créneau du premier travail lancé, puis la valeur trouvée remplace la
+    qualité de chaque commande. Les résultats sont gardés dans un cache
+    persistant par source et par paramètres.
+    """
+    
+    def __init__(self, settings, input_file, info=None, capabilities=None, cache=None):
+        self.settings = settings
+        self.input_file = input_file
+        self.info = info
+        self.capabilities = capabilities
+        self.cache = cache
+        self.result = None
+        self._lock = threading.Lock()
+    
+    def resolve(self, job=None):
+        with self._lock:
+            if self.result is None:
+                self.result = self._cached() or self._search(job)
+        return self.result
+    
+    def _cached(self):
+        entry = self.cache.get(self.input_file) if self.cache else None
+        result = (entry or {}).get(quality_cache_key(self.settings))
+        return tuple(result) if result else None
+    
+    def _search(self, job=None):
+        info = self.info or probe_media(get_ffprobe_path(self.settings.ffmpeg_path), self.input_file)
+        result = search_quality(self.settings, self.input_file, info, self.capabilities, job)
+        if self.cache:
+            stat = os.stat(self.input_file)
+            entry = dict(self.cache.get(self.input_file, stat) or {})
+            entry[quality_cache_key(self.settings)] = list(result)
+            self.cache.put(self.input_file, stat, entry)
+            self.cache.save()
+        return result
+    
+    def __call__(self, job):
+        job.quality = self.resolve(job)
+        job.cmd = with_quality(job.cmd, job.quality[0])
+
+
+def software_settings(settings, capabilities=None):
+    """Paramètres du repli logiciel d'un encodage NVENC (None si aucun repli possible)
+    
+    Même codec, décodage sur le CPU et une seule exécution de FFmpeg; le
+    préset est remplacé s'il n'existe pas pour l'encodeur logiciel.
+    """
+    encoder = SOFTWARE_FALLBACK.get(settings.video_encoder)
+    if encoder is None:
+        return None
+    fallback = EncodeSettings(**settings.to_dict())
+    fallback.video_encoder = encoder
+    fallback.hw_pipeline = False
+    fallback.two_pass = False
+    caps = capabilities if capabilities and capabilities.get('available') else {}
+    if fallback.preset not in caps.get('presets', {}).get(encoder, ()):
+        fallback.preset = FALLBACK_PRESETS[encoder]
+    if validate_settings(fallback, capabilities):
+        return None
+    return fallback
+
+
+class SoftwareFallback:
+    """Repli logiciel d'un travail NVENC après une erreur matérielle
+    
+    Sert de crochet `fallback` des travaux: `build()` renvoie la commande
+    avec l'encodeur logiciel; `prepare` remplace la recherche de qualité,
+    faite pour l'encodeur NVENC.
+    """
+    
+    def __init__(self, settings, build, pipeline=None, prepare=None):
+        self.settings = settings
+        self.build = build
+        self.pipeline = pipeline
+        self.prepare = prepare
+    
+    def __call__(self, job):
+        job.cmd = self.build()
+        job.encoder = self.settings.video_encoder
+        job.pipeline = f"{self.pipeline or job.pipeline}, repli {job.encoder}"
+        if job.prepare:
+            job.prepare = self.prepare
+
+
+def probe_for_planning(settings, files, media_cache, capabilities):
+    """Sonder les fichiers absents du cache si le planificateur a besoin du codec source
+    
+    Le décodage GPU et la copie de flux dépendent du codec et du format des sources.
+    """
+    if not (settings.hw_pipeline or settings.smart_copy) or not capabilities.get('available'):
+        return
+    ffprobe = get_ffprobe_path(settings.ffmpeg_path)
+    for file_path in files:
+        try:
+            if media_cache.get(file_path) is None:
+                media_cache.put(file_path, os.stat(file_path), probe_media(ffprobe, file_path))
+        except (OSError, RuntimeError, ValueError, subprocess.SubprocessError):
+            pass
+    media_cache.save()
+
+
+def prepare_jobs(settings, files, output_folder, media_cache=None, manifest=None, capabilities=None,
+                 quality_cache=None):
+    """Créer les travaux d'un lot
+    
+    Renvoie (travaux à exécuter, travaux ignorés car déjà à jour). Des
+    paramètres invalides lèvent ValueError avant la création des travaux.
+    """
+    jobs = []
+    skipped = []
+    template = compile_settings(settings, capabilities)
+    # Commandes de repli logiciel des travaux NVENC (erreur matérielle)
+    fallback = software_settings(settings, capabilities)
+    fallback_template = CommandTemplate(fallback, capabilities) if fallback else None
+    ladder = parse_ladder(settings.ladder)
+    if settings.target_quality and not ladder and quality_cache is None:
+        quality_cache = MediaInfoCache(os.path.join(get_config_dir(), 'quality_cache.json'))
+    for input_file in files:
+        output_file = get_output_filename(settings, output_folder, input_file)
+        info = media_cache.get(input_file) if media_cache else None
+        two_runs = quality = None
+        if ladder:
+            # Paliers: un seul FFmpeg, sans segments, deux passes ni qualité cible
+            job = plan_ladder_job(settings, input_file, output_file, ladder, capabilities, info)
+        else:
+            # ffmpeg écrit dans un fichier temporaire renommé à la fin du travail
+            temp_file = temp_output_name(output_file)
+            cmd = template.build(input_file, temp_file, info)
+            job = EncodeJob(input_file, output_file, cmd, settings.video_encoder)
+            job.temp_file = temp_file
+            two_runs = uses_two_runs(settings) and not can_copy_video(settings, info, output_file)
+            if two_runs:
+                # La commande normale ne reflète pas les passes: l'empreinte les inclut
+                job.signature = command_hash(cmd + ['two_pass', settings.first_pass_preset])
+            if settings.target_quality and not can_copy_video(settings, info, output_file):
+                # La qualité n'est connue qu'au lancement: l'empreinte contient la cible
+                quality = QualitySearch(settings, input_file, info, capabilities, quality_cache)
+                job.signature = command_hash(cmd + ['target', settings.quality_metric, str(settings.target_quality)])
+                job.prepare = quality
+            job.pipeline = template.plan(info, temp_file)[2]
+            if settings.smart_copy:
+                copy_audio = settings.audio_codec == 'copy' or can_copy_audio(settings, info, output_file)
+                job.pipeline += ", copie audio" if copy_audio else ", audio ré-encodé"
+            if fallback_template and not can_copy_video(settings, info, output_file):
+                job.fallback = SoftwareFallback(
+                    fallback, partial(fallback_template.build, input_file, temp_file, info),
+                    fallback_template.plan(info, temp_file)[2],
+                    QualitySearch(fallback, input_file, info, capabilities, quality_cache) if quality else None)
+            try:
+                job.estimated_size = estimate_output_size(settings, info, os.path.getsize(input_file))
+            except OSError:
+                job.estimated_size = 0
+        if info:
+            job.duration = info.get('duration')
+        if manifest and manifest.is_current(job):
+            job.status = EncodeJob.SKIPPED
+            job.progress = 1.0
+            skipped.append(job)
+            continue
+        if not settings.overwrite and not settings.incremental and any(
+                os.path.exists(path) for path in job.output_files):
+            job.status = EncodeJob.SKIPPED
+            job.error = "le fichier de sortie existe déjà"
+            job.progress = 1.0
+            skipped.append(job)
+            continue
+        
+        # Encodage segmenté des fichiers longs (inutile pour une copie de flux)
+        if settings.segments > 1 and not ladder and not can_copy_video(settings, info, output_file):
+            ffprobe = get_ffprobe_path(settings.ffmpeg_path)
+            try:
+                info = info or probe_media(ffprobe, input_file)
+                if info.get('duration') and info['duration'] >= settings.segment_min_duration:
+                    segmented = plan_segmented_jobs(settings, job, info, ffprobe, capabilities)
+                    if segmented:
+                        for part in segmented:
+                            if quality and ('-crf' in part.cmd or '-cq' in part.cmd):
+                                part.prepare = quality
+                                if part.fallback:
+                                    part.fallback.prepare = job.fallback.prepare
+                        jobs.extend(segmented)
+                        continue
+            except (OSError, RuntimeError, ValueError, subprocess.SubprocessError):
+                pass
+        
+        if two_runs:
+            jobs.extend(plan_two_pass_jobs(settings, job, capabilities, info))
+            continue
+        jobs.append(job)
+    
+    # Coût estimé de chaque travail, pour l'ordre de la file et les heures de fin
+    for job in jobs:
+        info = media_cache.get(job.input_file) if media_cache else None
+        try:
+            input_size = os.path.getsize(job.input_file)
+        except OSError:
+            input_size = None
+        job.cost = estimate_job_cost(job, info, input_size)
+    return jobs, skipped
+
+
+def run_cli(argv=None):
+    """Mode batch sans interface: fmmp.py batch [options] ENTRÉE... SORTIE"""
+    parser = argparse.ArgumentParser(
+        prog='fmmp.py batch',
+        description="Encoder des fichiers ou dossiers vidéo sans interface graphique"
+    )
+    parser.add_argument('inputs', nargs='+', metavar='ENTRÉE', help="fichiers ou dossiers vidéo")
+    parser.add_argument('output', metavar='SORTIE', help="dossier de sortie")
+    parser.add_argument('--preset', help="préset JSON ou nom d'un préset enregistré (paramètres d'encodage)")
+    parser.add_argument('--jobs', type=int, help="nombre d'encodages simultanés")
+    parser.add_argument('--hw-jobs', type=int, help="maximum d'encodages NVENC simultanés")
+    parser.add_argument('--sw-jobs', type=int, help="maximum d'encodages logiciels simultanés")
+    parser.add_argument('--incremental', action='store_true', help="ignorer les fichiers déjà à jour")
+    parser.add_argument('--two-pass', action='store_true', help="encodage en deux passes (débit cible: débit max)")
+    parser.add_argument('--smart-copy', action='store_true', help="copier les flux déjà conformes au lieu de les ré-encoder")
+    parser.add_argument('--segments', type=int,
+                        help="découper les fichiers longs en N segments encodés en parallèle "
+                             "(encodeur logiciel: --sw-jobs vaut alors N par défaut, dans la limite de --jobs)")
+    parser.add_argument('--target-quality', type=float,
+                        help="note cible (VMAF 0-100 ou SSIM 0-1): qualité choisie par fichier sur des échantillons")
+    parser.add_argument('--metric', choices=QUALITY_METRICS, help="métrique de la qualité cible")
+    parser.add_argument('--ladder', help="paliers encodés en un seul décodage, ex: 1080:6000,720:3000,480")
+    parser.add_argument('--stage-dir', help="précharger les sources dans ce dossier local (partages réseau)")
+    parser.add_argument('--watch', action='store_true',
+                        help="surveiller les dossiers d'entrée et encoder les nouveaux fichiers (Ctrl+C pour arrêter)")
+    parser.add_argument('--report', action='store_true', help="écrire un rapport JSON/CSV dans le dossier de sortie")
+    parser.add_argument('-v', '--verbose', action='store_true', help="afficher la sortie de FFmpeg")
+    args = parser.parse_args(argv)
+    
+    try:
+        if args.preset and not os.path.exists(args.preset):
+            settings = PresetStore().load(args.preset)
+        else:
+            settings = EncodeSettings.load(args.preset) if args.preset else EncodeSettings()
+    except (OSError, ValueError) as e:
+        parser.error(f"préset invalide: {e}")
+    if args.jobs:
+        settings.max_jobs = args.jobs
+    if args.hw_jobs:
+        settings.max_hw_jobs = args.hw_jobs
+    if args.sw_jobs:
+        settings.max_sw_jobs = args.sw_jobs
+    if args.incremental:
+        settings.incremental = True
+    if args.segments:
+        settings.segments = args.segments
+        if not args.sw_jobs:
+            # Sinon les segments d'un encodeur logiciel passeraient un par un
+            settings.max_sw_jobs = max(settings.max_sw_jobs, min(args.segments, settings.max_jobs))
+    if args.smart_copy:
+        settings.smart_copy = True
+    if args.two_pass:
+        settings.two_pass = True
+    if args.target_quality:
+        settings.target_quality = args.target_quality
+    if args.metric:
+        settings.quality_metric = args.metric
+    if args.ladder:
+        settings.ladder = args.ladder
+    if args.stage_dir:
+        settings.stage_dir = args.stage_dir
+    if args.report:
+        settings.write_report = True
+    
+    # Refuser un préset invalide avant de lancer le moindre encodage
+    capabilities = load_capabilities(settings.ffmpeg_path)
+    errors = validate_settings(settings, capabilities)
+    if errors:
+        parser.error("paramètres invalides:\n  " + "\n  ".join(errors))
+    
+    files = []
+    seen = set()
+    for path in args.inputs:
+        found = [p for p, _ in scan_videos(path)] if os.path.isdir(path) else [path]
+        for file_path in found:
+            file_path = os.path.normpath(file_path)
+            if file_path not in seen:
+                seen.add(file_path)
+                files.append(file_path)
+    watched = [path for path in args.inputs if os.path.isdir(path)] if args.watch else []
+    if args.watch and not watched:
+        parser.error("--watch demande au moins un dossier d'entrée")
+    if not files and not watched:
+        parser.error("aucun fichier vidéo trouvé")
+    os.makedirs(args.output, exist_ok=True)
+    
+    manifest = None
+    if settings.incremental:
+        manifest = JobManifest(os.path.join(args.output, MANIFEST_NAME))
+    media_cache = MediaInfoCache()
+    probe_for_planning(settings, files, media_cache, capabilities)
+    jobs, skipped = prepare_jobs(settings, files, args.output, media_cache, manifest, capabilities)
+    print(f"Fichiers: {len(files)} (à jour: {len(skipped)})", flush=True)
+    
+    def on_job_start(job):
+        end = scheduler.completion_times().get(job)
+        print(f"→ {job.name}" + (f" ({job.pipeline})" if job.pipeline else "")
+              + (f", fin estimée {time.strftime('%H:%M:%S', time.localtime(end))}" if end else ""), flush=True)
+    
+    def on_job_output(job, line):
+        if args.verbose:
+            print(f"[{job.name}] {line}", file=sys.stderr, flush=True)
+    
+    def on_job_end(job):
+        if manifest and job.status in (EncodeJob.SUCCESS, EncodeJob.FAILED):
+            manifest.record(job)
+        elapsed = (job.end_time or time.time()) - (job.start_time or time.time())
+        quality = f", qualité {job.quality[0]} ({job.quality[1]:.3f})" if job.quality else ""
+        failure = f", {job.failure}" if job.failure and job.status == EncodeJob.FAILED else ""
+        print(f"{'✓' if job.status == EncodeJob.SUCCESS else '✗'} {job.name} "
+              f"({job.status}, code {job.returncode}, {elapsed:.1f}s{quality}{failure})"
+              + (f": {job.error}" if job.error else ""), flush=True)
+    
+    def on_job_retry(job):
+        print(retry_message(job), flush=True)
+    
+    def on_disk_full(job):
+        print(f"⏸ En pause: espace disque insuffisant pour {job.name} "
+              f"(~{job.estimated_size // (1024 * 1024)} MB estimés)", flush=True)
+    
+    scheduler = EncodeScheduler(
+        max_jobs=settings.max_jobs,
+        max_hw_jobs=settings.max_hw_jobs,
+        max_sw_jobs=settings.max_sw_jobs,
+        on_job_start=on_job_start,
+        on_job_output=on_job_output,
+        on_job_end=on_job_end,
+        on_disk_full=on_disk_full,
+        stager=make_stager(settings),
+        on_job_retry=on_job_retry
+    )
+    
+    def on_new_file(path, stat):
+        # Fichier déposé dans un dossier surveillé: encodé sans attendre la fin du lot
+        try:
+            probe_for_planning(settings, [path], media_cache, capabilities)
+            new_jobs, new_skipped = prepare_jobs(settings, [path], args.output, media_cache, manifest,
+                                                 capabilities)
+        except (OSError, ValueError, RuntimeError, subprocess.SubprocessError) as e:
+            # Fichier ignoré, la surveillance continue
+            print(f"✗ {os.path.basename(path)} non ajouté au lot: {e}", flush=True)
+            return
+        files.append(path)
+        skipped.extend(new_skipped)
+        jobs.extend(new_jobs)
+        print(f"+ {os.path.basename(path)}" + (" (à jour)" if new_skipped else ""), flush=True)
+        scheduler.submit(new_jobs)
+    
+    watchers = [make_watcher(settings, path, args.output, on_new_file, files) for path in watched]
+    for watcher in watchers:
+        watcher.start()
+        print(f"Surveillance de {watcher.folder} ({watcher.backend}), Ctrl+C pour arrêter", flush=True)
+    signal.signal(signal.SIGINT, lambda signum, frame: scheduler.stop())
+    start_time = time.time()
+    scheduler.run(list(jobs), persistent=bool(watchers))
+    for watcher in watchers:
+        watcher.stop()
+    if settings.write_report:
+        print(f"Rapport: {write_run_report(skipped + jobs, args.output, start_time)}", flush=True)
+    
+    succeeded = len(skipped) + sum(1 for job in jobs if job.final and job.status == EncodeJob.SUCCESS)
+    print(f"Fichiers traités: {succeeded}/{len(files)}", flush=True)
+    return 0 if succeeded == len(files) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_cli())
@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+"""
+Serveur de travaux local: un seul ordonnanceur partagé par plusieurs clients
+Les interfaces soumettent leurs lots en JSON sur HTTP (127.0.0.1 seulement),
+suivent leur progression et annulent leurs travaux; les limites d'encodages
+simultanés s'appliquent à tous les utilisateurs de la machine
+"""
+
+import argparse
+import hmac
+import itertools
+import json
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fmmp_core import (
+    EncodeJob, EncodeScheduler, EncodeSettings, JobManifest, MediaInfoCache, MANIFEST_NAME, get_config_dir,
+    load_capabilities, prepare_jobs, probe_for_planning, retry_message, validate_settings,
+)
+
+
+# Port d'écoute par défaut
+DEFAULT_PORT = 47300
+# Lignes de FFmpeg non lues conservées par lot (les suivantes sont perdues)
+EVENT_BUFFER = 5000
+# Un lot dont le client ne s'est pas manifesté depuis ce délai est annulé (s)
+CLIENT_TIMEOUT_S = 60
+# Un lot terminé est oublié après ce délai (s)
+BATCH_KEEP_S = 600
+# Intervalle du ménage des lots (s)
+HOUSEKEEPING_S = 5
+# Intervalle d'interrogation du serveur par le client (s)
+POLL_INTERVAL_S = 0.5
+# Délai d'une requête du client (s)
+REQUEST_TIMEOUT_S = 30
+# Taille maximale du corps d'une requête (octets)
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+# Jeton partagé: variable d'environnement et en-tête HTTP; sans --token, le
+# serveur en tire un au hasard et l'écrit dans le dossier de configuration
+TOKEN_ENV = 'FMMP_TOKEN'
+TOKEN_HEADER = 'X-Fmmp-Token'
+
+# État d'un travail transmis aux clients
+JOB_FIELDS = ('input_file', 'output_file', 'encoder', 'status', 'returncode', 'error', 'progress',
+              'duration', 'frame', 'out_time', 'speed', 'bitrate', 'fps', 'input_size', 'output_size',
+              'peak_rss_kb', 'cpu_time', 'start_time', 'end_time', 'part', 'final', 'pipeline',
+              'estimated_size', 'quality', 'priority', 'pinned', 'cost', 'failure', 'attempts', 'not_before')
+
+
+def job_state(job, full=False):
+    """État d'un travail en JSON (`full`: avec la commande et les sorties)"""
+    state = {field: getattr(job, field) for field in JOB_FIELDS}
+    if full:
+        state['cmd'] = job.cmd
+        state['outputs'] = job.output_files
+    return state
+
+
+def apply_state(job, state):
+    """Recopier l'état reçu du serveur dans le travail local"""
+    for field in JOB_FIELDS:
+        if field in state:
+            setattr(job, field, state[field])
+    if 'cmd' in state:
+        job.cmd = state['cmd']
+    if 'outputs' in state:
+        job.extra_outputs = [(None, path) for path in state['outputs'][1:]]
+
+
+def token_path(port):
+    """Fichier du jeton du serveur local sur `port` (lisible par le seul compte du serveur)"""
+    return os.path.join(get_config_dir(), f'server_{port}.token')
+
+
+def write_token(port, token):
+    path = token_path(port)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    if os.name == 'posix':
+        os.chmod(path, 0o600)
+    return path
+
+
+def read_token(port):
+    """Jeton écrit par un serveur local du même compte (None si absent)"""
+    try:
+        with open(token_path(port), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def server_url(address):
+    """URL du serveur: « hôte:port », « port » ou « hôte » (port par défaut)"""
+    address = str(address).strip()
+    if address.isdigit():
+        address = f'127.0.0.1:{address}'
+    elif ':' not in address:
+        address = f'{address}:{DEFAULT_PORT}'
+    return f'http://{address}'
+
+
+class Batch:
+    """Lot soumis par un client: ses travaux et les événements qu'il n'a pas encore lus"""
+    
+    def __init__(self, batch_id, settings, output_folder, manifest=None):
+        self.id = batch_id
+        self.jobs = {}
+        self.settings = settings
+        self.output_folder = output_folder
+        self.manifest = manifest
+        # (numéro, type, travail, données): start, output, end, disk_full
+        self.events = deque()
+        self.seq = 0
+        self.output_lines = 0
+        self.dropped = 0
+        self.seen = time.time()
+        self.finished = None
+        # Préparations en cours ou non relues: identifiant -> réponse (None tant qu'elle tourne)
+        self.requests = {}
+        self.cancelled = False
+    
+    def add_event(self, kind, job_id, data=None):
+        if kind == 'output':
+            # Seules les lignes de FFmpeg peuvent être perdues, jamais les débuts et fins
+            if self.output_lines >= EVENT_BUFFER:
+                self.dropped += 1
+                return
+            self.output_lines += 1
+        self.seq += 1
+        self.events.append((self.seq, kind, job_id, data))
+    
+    def read(self, since):
+        """Événements après `since` (ceux d'avant sont lus et libérés)"""
+        while self.events and self.events[0][0] <= since:
+            if self.events.popleft()[1] == 'output':
+                self.output_lines -= 1
+        self.seen = time.time()
+        return list(self.events)
+    
+    def is_done(self):
+        if any(reply is None for reply in self.requests.values()):
+            return False
+        return all(job.status not in (EncodeJob.PENDING, EncodeJob.RUNNING) for job in self.jobs.values())
+
+
+class JobServer:
+    """Ordonnanceur permanent partagé et lots des clients
+    
+    Les travaux sont préparés par le serveur avec son propre FFmpeg: le
+    client n'envoie que ses paramètres, ses fichiers et son dossier de
+    sortie. L'analyse des fichiers peut être longue (cache froid, NAS): elle
+    se fait en arrière-plan et le client en attend le résultat par
+    interrogations successives. Un lot abandonné par son client est annulé.
+    """
+    
+    def __init__(self, max_jobs=2, max_hw_jobs=2, max_sw_jobs=1, ffmpeg_path='ffmpeg', token=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.token = token
+        self.capabilities = load_capabilities(ffmpeg_path)
+        self.media_cache = MediaInfoCache()
+        self.scheduler = EncodeScheduler(
+            max_jobs=max_jobs,
+            max_hw_jobs=max_hw_jobs,
+            max_sw_jobs=max_sw_jobs,
+            on_job_start=self.on_job_start,
+            on_job_output=self.on_job_output,
+            on_job_end=self.on_job_end,
+            on_disk_full=self.on_disk_full,
+            on_job_retry=self.on_job_retry
+        )
+        self.batches = {}
+        # Travail -> (lot, identifiant)
+        self._owners = {}
+        # Un seul manifeste par dossier de sortie, partagé par les lots qui y écrivent
+        self._manifests = {}
+        self._batch_ids = itertools.count(1)
+        self._job_ids = itertools.count(1)
+        self._request_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+    
+    def start(self):
+        """Lancer l'ordonnanceur et le ménage des lots en arrière-plan"""
+        for target in (lambda: self.scheduler.run([], persistent=True), self._housekeeping):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+        self.scheduler.stop()
+    
+    def _housekeeping(self):
+        while not self._stopped.wait(HOUSEKEEPING_S):
+            now = time.time()
+            abandoned = []
+            expired = []
+            with self._lock:
+                for batch in list(self.batches.values()):
+                    if batch.finished is None and batch.is_done():
+                        batch.finished = now
+                    if batch.finished is None and now - batch.seen > CLIENT_TIMEOUT_S:
+                        batch.seen = now
+                        abandoned.append(batch)
+                    elif batch.finished is not None and now - max(batch.finished, batch.seen) > BATCH_KEEP_S:
+                        del self.batches[batch.id]
+                        for job in batch.jobs.values():
+                            self._owners.pop(job, None)
+                        expired.extend(batch.jobs.values())
+            for batch in abandoned:
+                batch.cancelled = True
+                print(f"[lot {batch.id}] client injoignable depuis {CLIENT_TIMEOUT_S}s: lot annulé", flush=True)
+                self.scheduler.cancel(list(batch.jobs.values()))
+            if expired:
+                self.scheduler.forget(expired)
+    
+    def _event(self, kind, job, data=None):
+        with self._lock:
+            owner = self._owners.get(job)
+            if owner:
+                owner[0].add_event(kind, owner[1], data)
+        return owner
+    
+    def on_job_start(self, job):
+        owner = self._event('start', job, job_state(job, full=True))
+        if owner:
+            print(f"[lot {owner[0].id}] → {job.name}", flush=True)
+    
+    def on_job_output(self, job, line):
+        self._event('output', job, line)
+    
+    def on_job_end(self, job):
+        owner = self._owners.get(job)
+        if owner and owner[0].manifest and job.status in (EncodeJob.SUCCESS, EncodeJob.FAILED):
+            owner[0].manifest.record(job)
+        self._event('end', job, job_state(job))
+        if owner:
+            print(f"[lot {owner[0].id}] {'✓' if job.status == EncodeJob.SUCCESS else '✗'} {job.name} ({job.status})"
+                  + (f": {job.error}" if job.error else ""), flush=True)
+    
+    def on_job_retry(self, job):
+        owner = self._event('retry', job, job_state(job, full=True))
+        if owner:
+            print(f"[lot {owner[0].id}] {retry_message(job)}", flush=True)
+    
+    def on_disk_full(self, job):
+        self._event('disk_full', job)
+    
+    def _prepare(self, batch, request):
+        """Préparer les fichiers de la requête pour le lot et les mettre en file"""
+        files = [os.path.abspath(path) for path in request['files']]
+        probe_for_planning(batch.settings, files, self.media_cache, self.capabilities)
+        jobs, skipped = prepare_jobs(batch.settings, files, batch.output_folder, self.media_cache, batch.manifest,
+                                     self.capabilities)
+        priorities = request.get('priorities', {})
+        pinned = set(request.get('pinned', ()))
+        for job in jobs:
+            job.priority = int(priorities.get(job.input_file, 0))
+            job.pinned = job.input_file in pinned
+        
+        ids = []
+        with self._lock:
+            cancelled = batch.cancelled
+            for job in jobs:
+                job_id = next(self._job_ids)
+                batch.jobs[job_id] = job
+                self._owners[job] = (batch, job_id)
+                ids.append(job_id)
+            batch.finished = None
+        if cancelled:
+            # Lot annulé pendant la préparation: rien n'est lancé
+            for job in jobs:
+                job.status = EncodeJob.STOPPED
+                if job.cleanup:
+                    job.cleanup(job)
+        else:
+            print(f"[lot {batch.id}] {len(jobs)} travaux, {len(skipped)} à jour ({batch.output_folder})",
+                  flush=True)
+            self.scheduler.submit(jobs)
+        return {
+            'batch': batch.id,
+            'jobs': [dict(job_state(job, full=True), id=job_id) for job_id, job in zip(ids, jobs)],
+            'skipped': [job_state(job, full=True) for job in skipped],
+        }
+    
+    def submit(self, request):
+        """Créer un lot: {settings, files, output_folder, priorities, pinned}"""
+        settings = EncodeSettings(**request.get('settings', {}))
+        # Le serveur encode avec son FFmpeg et ses limites (fils par encodage
+        # compris), sans préchargement
+        settings.ffmpeg_path = self.ffmpeg_path
+        settings.max_jobs = self.scheduler.max_jobs
+        settings.max_hw_jobs = self.scheduler.max_hw_jobs
+        settings.max_sw_jobs = self.scheduler.max_sw_jobs
+        settings.stage_dir = ''
+        settings.server = ''
+        errors = validate_settings(settings, self.capabilities)
+        if errors:
+            raise ValueError("paramètres invalides:\n  " + "\n  ".join(errors))
+        output_folder = os.path.abspath(request['output_folder'])
+        os.makedirs(output_folder, exist_ok=True)
+        with self._lock:
+            manifest = None
+            if settings.incremental:
+                path = os.path.join(output_folder, MANIFEST_NAME)
+                manifest = self._manifests.get(path)
+                if manifest is None:
+                    manifest = self._manifests[path] = JobManifest(path)
+            batch = Batch(next(self._batch_ids), settings, output_folder, manifest)
+            self.batches[batch.id] = batch
+        return dict(self._start_preparation(batch, request), batch=batch.id)
+    
+    def add_files(self, batch_id, request):
+        """Ajouter des fichiers à un lot existant (dossier surveillé): {files, priorities, pinned}"""
+        with self._lock:
+            batch = self._batch(batch_id)
+        return self._start_preparation(batch, request)
+    
+    def _start_preparation(self, batch, request):
+        """Préparer les fichiers en arrière-plan; le résultat est lu par prepared()"""
+        request_id = next(self._request_ids)
+        with self._lock:
+            batch.requests[request_id] = None
+        thread = threading.Thread(target=self._run_preparation, args=(batch, request_id, request))
+        thread.daemon = True
+        thread.start()
+        return {'request': request_id}
+    
+    def _run_preparation(self, batch, request_id, request):
+        try:
+            reply = self._prepare(batch, request)
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            reply = {'error': str(e)}
+        with self._lock:
+            batch.requests[request_id] = reply
+    
+    def prepared(self, batch_id, request_id):
+        """Résultat d'une préparation: {done: False} tant qu'elle tourne, puis la réponse une seule fois"""
+        with self._lock:
+            batch = self._batch(batch_id)
+            batch.seen = time.time()
+            if request_id not in batch.requests:
+                raise LookupError(f"requête inconnue: {request_id}")
+            if batch.requests[request_id] is None:
+                return {'done': False}
+            return dict(batch.requests.pop(request_id), done=True)
+    
+    def _batch(self, batch_id):
+        batch = self.batches.get(int(batch_id))
+        if batch is None:
+            raise LookupError(f"lot inconnu: {batch_id}")
+        return batch
+    
+    def poll(self, batch_id, since):
+        """Nouveaux événements du lot, état des travaux en cours et heures de fin estimées"""
+        completion = self.scheduler.completion_times()
+        with self._lock:
+            batch = self._batch(batch_id)
+            events = batch.read(since)
+            ids = {job: job_id for job_id, job in batch.jobs.items()}
+            waiting = self.scheduler.waiting_for_space
+            return {
+                'seq': batch.seq,
+                'events': events,
+                'running': {job_id: job_state(job) for job, job_id in ids.items()
+                            if job.status == EncodeJob.RUNNING},
+                'completion': {job_id: completion[job] for job, job_id in ids.items() if job in completion},
+                'waiting_for_space': ids.get(waiting),
+                'dropped': batch.dropped,
+            }
+    
+    def cancel(self, batch_id):
+        with self._lock:
+            batch = self._batch(batch_id)
+            batch.cancelled = True
+            jobs = list(batch.jobs.values())
+        self.scheduler.cancel(jobs)
+        return {'cancelled': len(jobs)}
+    
+    def set_priority(self, batch_id, request):
+        with self._lock:
+            jobs = list(self._batch(batch_id).jobs.values())
+        self.scheduler.set_priority(request['input'], request.get('priority'), request.get('pinned'), jobs)
+        return {}
+    
+    def status(self):
+        scheduler = self.scheduler
+        with self._lock:
+            batches = len(self.batches)
+        return {
+            'max_jobs': scheduler.max_jobs,
+            'max_hw_jobs': scheduler.max_hw_jobs,
+            'max_sw_jobs': scheduler.max_sw_jobs,
+            'running': len(scheduler.running),
+            'pending': len(scheduler.pending),
+            'batches': batches,
+        }
+    
+    def handle(self, method, path, query, body):
+        """Répondre à une requête: (code HTTP, réponse JSON)"""
+        parts = [part for part in path.split('/') if part]
+        if method == 'GET' and parts == ['status']:
+            return 200, self.status()
+        if method == 'POST' and parts == ['batches']:
+            return 200, self.submit(body)
+        if len(parts) >= 2 and parts[0] == 'batches':
+            if method == 'GET' and len(parts) == 2:
+                return 200, self.poll(parts[1], int(query.get('since', ['0'])[0]))
+            if method == 'GET' and len(parts) == 4 and parts[2] == 'requests':
+                return 200, self.prepared(parts[1], int(parts[3]))
+            if method == 'POST' and parts[2:] == ['files']:
+                return 200, self.add_files(parts[1], body)
+            if method == 'POST' and parts[2:] == ['cancel']:
+                return 200, self.cancel(parts[1])
+            if method == 'POST' and parts[2:] == ['priority']:
+                return 200, self.set_priority(parts[1], body)
+        return 404, {'error': f"requête inconnue: {method} {path}"}
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """Requêtes HTTP JSON vers le JobServer (self.server.app)"""
+    server_version = 'fmmp'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _reply(self, code, data):
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _dispatch(self, method):
+        app = self.server.app
+        if self.headers.get('Origin') is not None:
+            # Requête d'une page web: jamais acceptée, quel que soit le jeton
+            return self._reply(403, {'error': "requête d'un navigateur refusée"})
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if method == 'POST' and content_type != 'application/json':
+            return self._reply(415, {'error': "Content-Type application/json attendu"})
+        if app.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), app.token):
+            return self._reply(403, {'error': "jeton invalide"})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_SIZE:
+            return self._reply(413, {'error': "requête trop volumineuse"})
+        url = urlsplit(self.path)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            code, data = app.handle(method, url.path, parse_qs(url.query), body)
+        except LookupError as e:
+            code, data = 404, {'error': str(e)}
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            code, data = 400, {'error': str(e)}
+        self._reply(code, data)
+    
+    def do_GET(self):
+        self._dispatch('GET')
+    
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+class RemoteScheduler(EncodeScheduler):
+    """Ordonnanceur d'un client: les travaux tournent sur le serveur de travaux
+    
+    Même interface que EncodeScheduler pour l'interface graphique; l'état
+    des travaux est recopié localement à chaque interrogation du serveur et
+    les rappels sont appelés depuis le thread de run(). Aucun processus
+    FFmpeg n'est lancé par le client.
+    """
+    
+    def __init__(self, address, on_job_start=None, on_job_output=None, on_job_end=None, on_disk_full=None,
+                 token=None, on_job_retry=None):
+        super().__init__(on_job_start=on_job_start, on_job_output=on_job_output, on_job_end=on_job_end,
+                         on_disk_full=on_disk_full, on_job_retry=on_job_retry)
+        self.url = server_url(address)
+        self.token = token or os.environ.get(TOKEN_ENV) or read_token(urlsplit(self.url).port)
+        self.batch = None
+        self._remote = {}
+        self._completion = {}
+    
+    def _request(self, method, path, data=None):
+        """Requête JSON au serveur; une erreur du serveur lève ValueError"""
+        request = urllib.request.Request(self.url + path, method=method,
+                                         data=json.dumps(data).encode('utf-8') if data is not None else None)
+        request.add_header('Content-Type', 'application/json')
+        if self.token:
+            request.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_S) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e)['error']
+            except (ValueError, KeyError, OSError):
+                message = str(e)
+            raise ValueError(message) from None
+    
+    def _mirror(self, state):
+        job = EncodeJob(state['input_file'], state['output_file'], state.get('cmd', []), state['encoder'])
+        job.signature = None
+        apply_state(job, state)
+        return job
+    
+    def prepare_jobs(self, settings, files, output_folder, priorities=({}, set())):
+        """Soumettre un lot au serveur: (travaux à exécuter, travaux ignorés) comme prepare_jobs()"""
+        file_priorities, pinned_files = priorities
+        reply = self._request('POST', '/batches', {
+            'settings': settings.to_dict(),
+            'files': [os.path.abspath(path) for path in files],
+            'output_folder': os.path.abspath(output_folder),
+            'priorities': {os.path.abspath(path): value for path, value in file_priorities.items()},
+            'pinned': [os.path.abspath(path) for path in pinned_files],
+        })
+        self.batch = reply['batch']
+        if self.stopped:
+            # Arrêt demandé pendant l'envoi
+            self._cancel()
+        reply = self._prepared(reply['request'])
+        jobs, skipped = self._mirror_reply(reply)
+        self.jobs = list(jobs)
+        return jobs, skipped
+    
+    def add_files(self, files):
+        """Ajouter des fichiers au lot en cours (dossier surveillé): (travaux, travaux ignorés)"""
+        reply = self._request('POST', f'/batches/{self.batch}/files',
+                              {'files': [os.path.abspath(path) for path in files]})
+        jobs, skipped = self._mirror_reply(self._prepared(reply['request']))
+        self.jobs.extend(jobs)
+        return jobs, skipped
+    
+    def _prepared(self, request_id):
+        """Attendre la fin de la préparation côté serveur (analyse des fichiers sans délai maximal)"""
+        while True:
+            reply = self._request('GET', f'/batches/{self.batch}/requests/{request_id}')
+            if reply['done']:
+                break
+            time.sleep(POLL_INTERVAL_S)
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply
+    
+    def _mirror_reply(self, reply):
+        jobs = []
+        for state in reply['jobs']:
+            jobs.append(self._mirror(state))
+            self._remote[state['id']] = jobs[-1]
+        return jobs, [self._mirror(state) for state in reply['skipped']]
+    
+    def _cancel(self):
+        try:
+            self._request('POST', f'/batches/{self.batch}/cancel', {})
+        except (OSError, ValueError):
+            pass
+    
+    def _apply_event(self, kind, job, data):
+        if kind == 'start':
+            apply_state(job, data)
+            self.running.append(job)
+            if self.on_job_start:
+                self.on_job_start(job)
+        elif kind == 'output':
+            if self.on_job_output:
+                self.on_job_output(job, data)
+        elif kind == 'end':
+            apply_state(job, data)
+            if job in self.running:
+                self.running.remove(job)
+            if self.on_job_end:
+                self.on_job_end(job)
+        elif kind == 'retry':
+            # Remis en file par le serveur (nouvel essai ou repli logiciel)
+            apply_state(job, data)
+            if job in self.running:
+                self.running.remove(job)
+            if self.on_job_retry:
+                self.on_job_retry(job)
+        elif kind == 'disk_full' and self.on_disk_full:
+            self.on_disk_full(job)
+    
+    def run(self, jobs, persistent=False):
+        """Suivre le lot sur le serveur jusqu'à la fin de tous ses travaux
+        
+        Avec `persistent`, continuer jusqu'à stop() ou drain() (fichiers ajoutés par add_files()).
+        """
+        known = set(self.jobs)
+        self.jobs.extend(job for job in jobs if job not in known)
+        self.persistent = persistent
+        since = 0
+        unreachable = None
+        while (any(job.status in (EncodeJob.PENDING, EncodeJob.RUNNING) for job in self.jobs)
+               or (self.persistent and not self.stopped)):
+            try:
+                reply = self._request('GET', f'/batches/{self.batch}?since={since}')
+            except (OSError, ValueError) as e:
+                unreachable = unreachable or time.time()
+                if time.time() - unreachable > CLIENT_TIMEOUT_S:
+                    for job in self.jobs:
+                        if job.status in (EncodeJob.PENDING, EncodeJob.RUNNING):
+                            job.status = EncodeJob.FAILED
+                            job.error = f"serveur de travaux injoignable: {e}"
+                            if self.on_job_end:
+                                self.on_job_end(job)
+                    break
+                time.sleep(POLL_INTERVAL_S)
+                continue
+            unreachable = None
+            
+            for seq, kind, job_id, data in reply['events']:
+                if job_id not in self._remote:
+                    # Travail d'un add_files() dont la réponse n'est pas encore arrivée: relu au prochain tour
+                    break
+                self._apply_event(kind, self._remote[job_id], data)
+                since = seq
+            for job_id, state in reply['running'].items():
+                if int(job_id) in self._remote:
+                    apply_state(self._remote[int(job_id)], state)
+            self._completion = {self._remote[int(job_id)]: end for job_id, end in reply['completion'].items()
+                                if int(job_id) in self._remote}
+            self.waiting_for_space = self._remote.get(reply['waiting_for_space'])
+            time.sleep(POLL_INTERVAL_S)
+        self.running = []
+        return self.jobs
+    
+    def completion_times(self):
+        return dict(self._completion)
+    
+    def set_priority(self, input_file, priority=None, pinned=None, jobs=None):
+        super().set_priority(input_file, priority, pinned, jobs)
+        if self.batch is not None:
+            try:
+                self._request('POST', f'/batches/{self.batch}/priority',
+                              {'input': os.path.abspath(input_file), 'priority': priority, 'pinned': pinned})
+            except (OSError, ValueError):
+                pass
+    
+    def stop(self):
+        """Annuler le lot sur le serveur (les travaux des autres clients continuent)"""
+        self.stopped = True
+        if self.batch is not None:
+            self._cancel()
+
+
+def run_server(argv=None):
+    """Serveur de travaux: fmmp.py serve [options]"""
+    defaults = EncodeSettings()
+    parser = argparse.ArgumentParser(
+        prog='fmmp.py serve',
+        description="Partager un seul ensemble d'encodeurs entre plusieurs interfaces (127.0.0.1)"
+    )
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port d'écoute")
+    parser.add_argument('--jobs', type=int, default=defaults.max_jobs, help="nombre d'encodages simultanés")
+    parser.add_argument('--hw-jobs', type=int, default=defaults.max_hw_jobs, help="maximum d'encodages NVENC simultanés")
+    parser.add_argument('--sw-jobs', type=int, default=defaults.max_sw_jobs, help="maximum d'encodages logiciels simultanés")
+    parser.add_argument('--ffmpeg', default=defaults.ffmpeg_path, help="chemin de FFmpeg utilisé pour tous les lots")
+    parser.add_argument('--token', default=os.environ.get(TOKEN_ENV),
+                        help=f"jeton exigé des clients (défaut: ${TOKEN_ENV}, sinon tiré au hasard)")
+    args = parser.parse_args(argv)
+    
+    token = args.token or secrets.token_urlsafe(24)
+    app = JobServer(args.jobs, args.hw_jobs, args.sw_jobs, args.ffmpeg, token)
+    if not app.capabilities.get('available'):
+        parser.error(f"FFmpeg introuvable: {args.ffmpeg}")
+    try:
+        httpd = ThreadingHTTPServer(('127.0.0.1', args.port), JobRequestHandler)
+    except OSError as e:
+        parser.error(f"port {args.port} indisponible: {e}")
+    httpd.daemon_threads = True
+    httpd.app = app
+    try:
+        print(f"Jeton des clients: {write_token(args.port, token)}", flush=True)
+    except OSError as e:
+        print(f"Jeton non enregistré ({e}): clients à lancer avec {TOKEN_ENV}", flush=True)
+    app.start()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Serveur de travaux sur http://127.0.0.1:{args.port} "
+          f"({args.jobs} encodages, NVENC {args.hw_jobs}, logiciel {args.sw_jobs})", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.stop()
+        httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_server())